@@ -143,16 +143,13 @@ def train(epochs: int) -> None:
             loss_meter.update(loss.item())
             box_loss_meter.update(box_loss.item())
             label_loss_meter.update(label_loss.item())
-            for boxes, gt_boxes, labels, gt_labels, confidences in zip(
-                box_batch, gt_box_batch, label_batch, gt_label_batch, confidence_batch
-            ):
-                metrics.add(
-                    boxes=yolo_to_pascal(boxes, (w, h)),
-                    confidences=confidences,
-                    labels=labels,
-                    gt_boxes=yolo_to_pascal(gt_boxes, (w, h)),
-                    gt_labels=gt_labels,
-                )
+            metrics.add_batch(
+                [yolo_to_pascal(x, (w, h)) for x in box_batch],
+                confidence_batch,
+                label_batch,
+                [yolo_to_pascal(x, (w, h)) for x in gt_box_batch],
+                gt_label_batch,
+            )
 
         visualize(
             netout,
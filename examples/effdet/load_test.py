@@ -0,0 +1,102 @@
+import asyncio
+import time
+import torch
+from typing import Dict, List
+from object_detection.entities import ImageId, Image
+from object_detection.models.backbones.effnet import (
+    EfficientNetBackbone,
+)
+from object_detection.models.effidet import (
+    EfficientDet,
+    ToBoxes,
+    Anchors,
+)
+from object_detection.serving import (
+    BatchPredictor,
+    InferenceServer,
+    InferenceClient,
+)
+from examples.effdet import config
+from logging import (
+    getLogger,
+    basicConfig,
+    INFO,
+)
+
+logger = getLogger(__name__)
+
+
+def build_predictor(max_batch_size: int, max_wait: float) -> BatchPredictor:
+    backbone = EfficientNetBackbone(
+        config.backbone_id,
+        out_channels=config.channels,
+        pretrained=False,
+    )
+    anchors = Anchors(
+        size=config.anchor_size,
+        ratios=config.anchor_ratios,
+        scales=config.anchor_scales,
+    )
+    model = EfficientDet(
+        num_classes=config.num_classes,
+        out_ids=config.out_ids,
+        channels=config.channels,
+        backbone=backbone,
+        anchors=anchors,
+        box_depth=config.box_depth,
+        input_size=config.input_size,
+    )
+    to_boxes = ToBoxes(
+        confidence_threshold=config.confidence_threshold,
+        iou_threshold=config.iou_threshold,
+        limit=config.object_count_range[1],
+        use_batch=True,
+    )
+    return BatchPredictor(
+        model, to_boxes, max_batch_size=max_batch_size, max_wait=max_wait
+    )
+
+
+async def load_test(
+    max_batch_size: int,
+    max_wait: float = 0.005,
+    concurrency: int = 16,
+    requests_per_client: int = 8,
+) -> Dict[str, float]:
+    """
+    concurrency clients, each sending requests_per_client images one after another
+    """
+    server = InferenceServer(build_predictor(max_batch_size, max_wait), port=0)
+    await server.start()
+    image = Image(torch.rand((3, *config.input_size)))
+
+    async def client_loop(client_id: int) -> None:
+        client = InferenceClient(port=server.port)
+        for i in range(requests_per_client):
+            await client.predict((ImageId(f"{client_id}-{i}"), image))
+        await client.close()
+
+    # warm up
+    await client_loop(-1)
+    server.predictor.reset_metrics()
+    started_at = time.perf_counter()
+    await asyncio.gather(*[client_loop(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - started_at
+    metrics = server.predictor.metrics()
+    await server.close()
+    return {**metrics, "wall_time": elapsed}
+
+
+def main(batch_sizes: List[int] = [1, 4, 8, 16]) -> None:
+    torch.set_num_threads(max(torch.get_num_threads(), 1))
+    for max_batch_size in batch_sizes:
+        metrics = asyncio.run(load_test(max_batch_size))
+        logger.info(
+            f"max_batch_size={max_batch_size},"
+            + ",".join([f"{k}={v:.4f}" for k, v in metrics.items()])
+        )
+
+
+if __name__ == "__main__":
+    basicConfig(level=INFO)
+    main()
@@ -0,0 +1,122 @@
+import time
+import torch
+from pathlib import Path
+from torch import nn
+from torch.utils.data import DataLoader
+from typing import Dict
+from object_detection.metrics import MeanAveragePrecision
+from object_detection.models.backbones.effnet import (
+    EfficientNetBackbone,
+)
+from object_detection.models.effidet import (
+    collate_fn,
+    prediction_collate_fn,
+    EfficientDet,
+    ToBoxes,
+    Anchors,
+)
+from object_detection.models.optimize import optimize_for_inference
+from object_detection.models.quantize import quantize_effdet
+from examples.data import TrainDataset, PredictionDataset
+from examples.effdet import config
+from logging import (
+    getLogger,
+    basicConfig,
+    INFO,
+)
+
+logger = getLogger(__name__)
+
+
+def build_model() -> EfficientDet:
+    backbone = EfficientNetBackbone(
+        config.backbone_id,
+        out_channels=config.channels,
+        pretrained=False,
+    )
+    anchors = Anchors(
+        size=config.anchor_size,
+        ratios=config.anchor_ratios,
+        scales=config.anchor_scales,
+    )
+    model = EfficientDet(
+        num_classes=config.num_classes,
+        out_ids=config.out_ids,
+        channels=config.channels,
+        backbone=backbone,
+        anchors=anchors,
+        box_depth=config.box_depth,
+        input_size=config.input_size,
+    )
+    weights = Path(config.out_dir) / f"{config.metric[0]}.pth"
+    if weights.exists():
+        logger.info(f"load model from {weights}")
+        model.load_state_dict(torch.load(weights, map_location="cpu"))
+    return model.eval()
+
+
+@torch.no_grad()
+def evaluate(
+    model: nn.Module, loader: DataLoader, to_boxes: ToBoxes
+) -> Dict[str, float]:
+    """
+    score: MeanAveragePrecision as examples/effdet/train.py
+    latency: seconds per batch of the model and decoding
+    """
+    metrics = MeanAveragePrecision(iou_threshold=0.3, num_classes=config.num_classes)
+    elapsed = 0.0
+    for image_batch, gt_box_batch, gt_label_batch, _ in loader:
+        started_at = time.perf_counter()
+        box_batch, confidence_batch, label_batch = to_boxes(model(image_batch))
+        elapsed += time.perf_counter() - started_at
+        metrics.add_batch(
+            box_batch, confidence_batch, label_batch, gt_box_batch, gt_label_batch
+        )
+    score, _ = metrics()
+    return {"score": score, "latency": elapsed / len(loader)}
+
+
+def main(batch_size: int = 8, num_samples: int = 128) -> None:
+    torch.manual_seed(0)
+    model = build_model()
+    to_boxes = ToBoxes(
+        confidence_threshold=config.confidence_threshold,
+        iou_threshold=config.iou_threshold,
+        limit=config.object_count_range[1],
+        use_batch=True,
+    )
+    calibration_loader = DataLoader(
+        PredictionDataset(
+            config.input_size,
+            object_count_range=config.object_count_range,
+            object_size_range=config.object_size_range,
+            num_samples=num_samples,
+        ),
+        batch_size=batch_size,
+        collate_fn=prediction_collate_fn,
+    )
+    test_dataset = TrainDataset(
+        config.input_size,
+        object_count_range=config.object_count_range,
+        object_size_range=config.object_size_range,
+        num_samples=num_samples,
+    )
+    # the same images for every model
+    test_loader = DataLoader(
+        [test_dataset[i] for i in range(len(test_dataset))],  # type:ignore
+        batch_size=batch_size,
+        collate_fn=collate_fn,
+    )
+    models = {
+        "fp32": model,
+        "fp32-optimized": optimize_for_inference(model),
+        "int8": quantize_effdet(model, calibration_loader, config.input_size),
+    }
+    for name, m in models.items():
+        metrics = evaluate(m, test_loader, to_boxes)
+        logger.info(f"{name}," + ",".join([f"{k}={v:.4f}" for k, v in metrics.items()]))
+
+
+if __name__ == "__main__":
+    basicConfig(level=INFO)
+    main()
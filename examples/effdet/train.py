@@ -156,16 +156,9 @@ def train(epochs: int) -> None:
             box_loss_meter.update(box_loss.item())
             label_loss_meter.update(label_loss.item())
 
-            for boxes, gt_boxes, labels, gt_labels, confidences in zip(
-                box_batch, gt_box_batch, label_batch, gt_label_batch, confidence_batch
-            ):
-                metrics.add(
-                    boxes=boxes,
-                    confidences=confidences,
-                    labels=labels,
-                    gt_boxes=gt_boxes,
-                    gt_labels=gt_labels,
-                )
+            metrics.add_batch(
+                box_batch, confidence_batch, label_batch, gt_box_batch, gt_label_batch
+            )
 
         score, scores = metrics()
         logs["test_loss"] = loss_meter.get_value()
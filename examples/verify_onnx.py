@@ -0,0 +1,162 @@
+import sys
+import time
+import torch
+from pathlib import Path
+from torch import Tensor
+from typing import Any, Callable, Dict, List, Tuple, Union
+from object_detection.models import effidet, centernet
+from object_detection.models.backbones.effnet import EfficientNetBackbone
+from object_detection.models.backbones.resnet import ResNetBackbone
+from object_detection.models.deploy import export_onnx
+from examples.effdet import config as effdet_config
+from examples.centernet import config as centernet_config
+from logging import (
+    getLogger,
+    basicConfig,
+    INFO,
+)
+
+logger = getLogger(__name__)
+
+# model, to_boxes, input_size, weights
+Built = Tuple[
+    Union[effidet.EfficientDet, centernet.CenterNet],
+    Union[effidet.ToBoxes, centernet.ToBoxes],
+    Tuple[int, int],
+    str,
+]
+
+
+def build_effdet() -> Built:
+    cfg = effdet_config
+    backbone = EfficientNetBackbone(
+        cfg.backbone_id,
+        out_channels=cfg.channels,
+        pretrained=False,
+    )
+    anchors = effidet.Anchors(
+        size=cfg.anchor_size,
+        ratios=cfg.anchor_ratios,
+        scales=cfg.anchor_scales,
+    )
+    model = effidet.EfficientDet(
+        num_classes=cfg.num_classes,
+        out_ids=cfg.out_ids,
+        channels=cfg.channels,
+        backbone=backbone,
+        anchors=anchors,
+        box_depth=cfg.box_depth,
+        input_size=cfg.input_size,
+    )
+    to_boxes = effidet.ToBoxes(
+        confidence_threshold=cfg.confidence_threshold,
+        iou_threshold=cfg.iou_threshold,
+        limit=cfg.object_count_range[1],
+        use_batch=True,
+    )
+    return model, to_boxes, cfg.input_size, f"{cfg.out_dir}/{cfg.metric[0]}.pth"
+
+
+def build_centernet() -> Built:
+    cfg = centernet_config
+    backbone = ResNetBackbone("resnet50", out_channels=cfg.channels)
+    model = centernet.CenterNet(
+        num_classes=cfg.num_classes,
+        channels=cfg.channels,
+        backbone=backbone,
+        out_idx=cfg.out_idx,
+        box_depth=cfg.box_depth,
+        cls_depth=cfg.cls_depth,
+    )
+    to_boxes = centernet.ToBoxes(threshold=cfg.to_boxes_threshold, use_batch=True)
+    return model, to_boxes, cfg.input_size, f"{cfg.out_dir}/{cfg.metric[0]}.pth"
+
+
+def latency(run: Callable[[], Any], repeat: int = 20) -> float:
+    run()
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return (time.perf_counter() - started_at) / repeat
+
+
+def compare(
+    padded: List[Tensor],
+    expected: Tuple[List[Tensor], List[Tensor], List[Tensor]],
+    scale: float = 1.0,
+    atol: float = 1e-3,
+) -> Dict[str, float]:
+    """
+    matches each eager box to the nearest onnx box, order free.
+    scale: of the boxes, ex) the input size for pascal boxes in pixels
+    match_rate: eager boxes with an onnx box of the same label within atol
+    """
+    boxes, scores, labels = padded
+    matched = 0
+    total = 0
+    score_diff = 0.0
+    count_diff = 0
+    for i, (expected_boxes, expected_scores, expected_labels) in enumerate(
+        zip(*expected)
+    ):
+        count = int((labels[i] >= 0).sum())
+        count_diff = max(count_diff, abs(count - len(expected_boxes)))
+        total += len(expected_boxes)
+        if count == 0 or len(expected_boxes) == 0:
+            continue
+        distances = torch.cdist(expected_boxes.float(), boxes[i, :count]) / scale
+        # the same box is often kept for several labels
+        same_label = expected_labels.view(-1, 1) == labels[i, :count].view(1, -1)
+        distances, ids = distances.masked_fill(~same_label, float("inf")).min(dim=1)
+        ok = distances < atol
+        matched += int(ok.sum())
+        if ok.any():
+            diff = (scores[i, ids] - expected_scores)[ok].abs().max()
+            score_diff = max(score_diff, float(diff))
+    return {
+        "match_rate": matched / total if total > 0 else 1.0,
+        "max_count_diff": float(count_diff),
+        "max_score_diff": score_diff,
+    }
+
+
+@torch.no_grad()
+def verify(kind: str, batch_sizes: List[int] = [1, 4, 8]) -> None:
+    import onnxruntime as ort
+
+    model, to_boxes, input_size, weights = {
+        "effdet": build_effdet,
+        "centernet": build_centernet,
+    }[kind]()
+    if Path(weights).exists():
+        logger.info(f"load model from {weights}")
+        model.load_state_dict(torch.load(weights, map_location="cpu"))
+    model.eval()
+    path = f"/tmp/{kind}.onnx"
+    export_onnx(model, to_boxes, path, input_size)
+    logger.info(f"exported {path}")
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    def decode(images: Tensor) -> Any:
+        outputs = model(images)
+        # CenterNet gives (netout, anchors)
+        return to_boxes(outputs[0] if kind == "centernet" else outputs)
+
+    for batch_size in batch_sizes:
+        images = torch.rand(batch_size, 3, *input_size)
+        feed = {"images": images.numpy()}
+        padded = [torch.from_numpy(x) for x in session.run(None, feed)]
+        # EfficientDet gives pascal boxes in pixels, CenterNet yolo boxes
+        scale = max(input_size) if kind == "effdet" else 1.0
+        metrics = compare(padded, decode(images), scale=scale)
+        metrics["eager"] = latency(lambda: decode(images))
+        metrics["onnxruntime"] = latency(lambda: session.run(None, feed))
+        logger.info(
+            f"{kind},batch_size={batch_size},"
+            + ",".join([f"{k}={v:.4f}" for k, v in metrics.items()])
+        )
+
+
+if __name__ == "__main__":
+    basicConfig(level=INFO)
+    verify(sys.argv[1] if len(sys.argv) > 1 else "effdet")
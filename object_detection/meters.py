@@ -1,6 +1,7 @@
 import numpy as np
 import operator
 import math
+from collections import deque
 from logging import getLogger
 from typing_extensions import Literal
 
@@ -40,3 +41,27 @@ class MeanMeter:
     def reset(self) -> None:
         self.sum = 0.0
         self.count = 0.0
+
+
+class PercentileMeter:
+    def __init__(self, window: int = 10000) -> None:
+        """
+        window: percentiles over the last window values, to keep memory and
+            get_value bounded for a long running process
+        """
+        self.window = window
+        self.values: deque = deque(maxlen=window)
+        self.count = 0
+
+    def update(self, value: float) -> None:
+        self.values.append(value)
+        self.count += 1
+
+    def get_value(self, q: float = 50.0) -> float:
+        if len(self.values) == 0:
+            return 0.0
+        return float(np.percentile(self.values, q))
+
+    def reset(self) -> None:
+        self.values.clear()
+        self.count = 0
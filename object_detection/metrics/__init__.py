@@ -1,3 +1,4 @@
 from .mean_precision import MeanPrecition
 from .mean_average_precision import MeanAveragePrecision
 from .average_precision import AveragePrecision
+from .coco_mean_average_precision import CocoMeanAveragePrecision
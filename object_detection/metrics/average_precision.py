@@ -1,5 +1,5 @@
 import torch
-from typing import Set, Any, Tuple, List
+from typing import Any, Dict, Tuple, List, Optional
 import numpy as np
 from object_detection.entities import PascalBoxes, Confidences
 from torchvision.ops.boxes import box_iou
@@ -11,28 +11,118 @@ def auc(
 ) -> float:
     rec = np.concatenate(([0.0], recall, [1.0]))
     pre = np.concatenate(([0.0], precision, [0.0]))
-    for i in range(pre.size - 1, 0, -1):
-        pre[i - 1] = np.maximum(pre[i - 1], pre[i])
+    pre = np.maximum.accumulate(pre[::-1])[::-1]
     i = np.where(rec[1:] != rec[:-1])[0]
     return np.sum((rec[i + 1] - rec[i]) * pre[i + 1])
 
 
+class GrowableArray:
+    """
+    preallocated 1d array. the capacity doubles when it runs out.
+    """
+
+    def __init__(self, capacity: int = 1024, dtype: Any = np.float64) -> None:
+        self.buffer = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: Any) -> None:
+        count = len(values)
+        if self.size + count > len(self.buffer):
+            capacity = max(len(self.buffer) * 2, self.size + count)
+            buffer = np.zeros(capacity, dtype=self.buffer.dtype)
+            buffer[: self.size] = self.buffer[: self.size]
+            self.buffer = buffer
+        self.buffer[self.size : self.size + count] = values
+        self.size += count
+
+    def clear(self) -> None:
+        self.size = 0
+
+    def view(self) -> Any:
+        return self.buffer[: self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def match_greedy(
+    iou_matrix: torch.Tensor,
+    iou_threshold: float,
+) -> Any:
+    """
+    iou_matrix: [n_box, n_gt_box], boxes sorted by descending confidence
+    return: tp [n_box]
+        a box is tp when its best gt is over the threshold and
+        no earlier box took that gt.
+    """
+    ious, matched_gt_ids = torch.max(iou_matrix, dim=1)
+    tp = np.zeros(len(iou_matrix))
+    box_ids = np.nonzero((ious > iou_threshold).to("cpu").numpy())[0]
+    _, first_ids = np.unique(
+        matched_gt_ids.to("cpu").numpy()[box_ids], return_index=True
+    )
+    tp[box_ids[first_ids]] = 1
+    return tp
+
+
 class AveragePrecision:
     def __init__(
         self,
         iou_threshold: float,
         eps: float = 1e-8,
+        use_growable_array: bool = False,
+        bins: Optional[int] = None,
     ) -> None:
+        """
+        use_growable_array: store tp and confidences in preallocated
+            arrays instead of lists of per image arrays.
+        bins: count tp and fp in a histogram of confidences (0-1) instead
+            of storing them. memory and readout are O(bins).
+            the order within a bin is lost. bounds() gives the range the
+            exact AP lies in, and AP is read at the end of each bin, inside it.
+        """
         self.iou_threshold = iou_threshold
         self.eps = eps
+        self.use_growable_array = use_growable_array
+        self.bins = bins
+        self.tp_hist = np.zeros(bins or 0, dtype=np.int64)
+        self.fp_hist = np.zeros(bins or 0, dtype=np.int64)
         self.tp_list: List[Any] = []
         self.confidence_list: List[Any] = []
+        self.tp_array = GrowableArray()
+        self.confidence_array = GrowableArray()
         self.n_gt_box = 0
 
     def reset(self) -> None:
         self.n_gt_box = 0
         self.confidence_list = []
         self.tp_list = []
+        self.tp_array.clear()
+        self.confidence_array.clear()
+        self.tp_hist[:] = 0
+        self.fp_hist[:] = 0
+
+    def append(self, tp: Any, confidences: Any) -> None:
+        if self.bins is not None:
+            bin_ids = (np.asarray(confidences) * self.bins).astype(np.int64)
+            bin_ids = np.clip(bin_ids, 0, self.bins - 1)
+            tp_counts = np.bincount(bin_ids, weights=tp, minlength=self.bins)
+            box_counts = np.bincount(bin_ids, minlength=self.bins)
+            self.tp_hist += tp_counts.astype(np.int64)
+            self.fp_hist += box_counts - tp_counts.astype(np.int64)
+        elif self.use_growable_array:
+            self.tp_array.extend(tp)
+            self.confidence_array.extend(confidences)
+        else:
+            self.tp_list.append(tp)
+            self.confidence_list.append(confidences)
+
+    def _values(self) -> Tuple[Any, Any]:
+        if self.use_growable_array:
+            return self.tp_array.view(), self.confidence_array.view()
+        if len(self.tp_list) == 0:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(self.tp_list), np.concatenate(self.confidence_list)
 
     def add(
         self,
@@ -45,29 +135,108 @@ class AveragePrecision:
         n_box = len(boxes)
         if n_gt_box == 0 and n_box == 0:
             return
-        tp = np.zeros(n_box)
+        self.n_gt_box += n_gt_box
         if n_box == 0 or n_gt_box == 0:
-            self.tp_list.append(tp)
-            self.confidence_list.append(confidences.to("cpu").numpy())
+            self.append(np.zeros(n_box), confidences.to("cpu").numpy())
             return
 
         sort_indecis = confidences.argsort(descending=True)
         iou_matrix = box_iou(boxes[sort_indecis], gt_boxes)
-        ious, matched_cls_indices = torch.max(iou_matrix, dim=1)
-        matched: Set = set()
-        for box_id, cls_id in enumerate(matched_cls_indices.to("cpu").numpy()):
-            if ious[box_id] > self.iou_threshold and cls_id not in matched:
-                tp[box_id] = 1
-                matched.add(cls_id)
-        self.tp_list.append(tp)
-        self.confidence_list.append(confidences.to("cpu").numpy())
-        self.n_gt_box += n_gt_box
+        tp = match_greedy(iou_matrix, self.iou_threshold)
+        self.append(tp, confidences[sort_indecis].to("cpu").numpy())
+
+    def state_dict(self) -> Dict[str, Any]:
+        """
+        tp: [n_box] bool
+        confidences: [n_box]
+        n_gt_box: int
+        or with bins
+        tp_hist, fp_hist: [bins]
+        n_gt_box: int
+        """
+        if self.bins is not None:
+            return {
+                "tp_hist": self.tp_hist.copy(),
+                "fp_hist": self.fp_hist.copy(),
+                "n_gt_box": self.n_gt_box,
+            }
+        tp, confidences = self._values()
+        return {
+            "tp": tp.astype(bool),
+            "confidences": confidences.copy(),
+            "n_gt_box": self.n_gt_box,
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        self.reset()
+        self._load(state)
+
+    def merge(self, other: "AveragePrecision") -> None:
+        """
+        add the state of other, ex) partial results of another worker.
+        """
+        self._load(other.state_dict())
+
+    def _load(self, state: Dict[str, Any]) -> None:
+        self.n_gt_box += int(state["n_gt_box"])
+        if self.bins is not None:
+            self.tp_hist += state["tp_hist"]
+            self.fp_hist += state["fp_hist"]
+        elif len(state["tp"]) > 0:
+            self.append(state["tp"].astype(np.float64), state["confidences"])
+
+    def _hist_curve(self) -> Tuple[Any, Any, Any, Any]:
+        """
+        tp, fp counts per bin and their cumsum, from the highest confidence
+        """
+        tps = self.tp_hist[::-1]
+        fps = self.fp_hist[::-1]
+        return tps, fps, tps.cumsum(), fps.cumsum()
+
+    def bounds(self) -> Tuple[float, float]:
+        """
+        lower and upper bound of the exact AP.
+        without bins both are the exact AP.
+        in a bin, the k-th tp has precision between
+            (T' + 1) / (T' + 1 + F) when all fp of the bin come first and
+            T / (T + F') when they all come last
+        T', F': counts before the bin, T, F: counts up to its end.
+        AP is monotonic in these precisions, so the bounds are AP with
+        them. the gap shrinks as the bins get finer.
+        """
+        if self.bins is None:
+            ap = self()
+            return ap, ap
+        tps, fps, tpc, fpc = self._hist_curve()
+        if self.n_gt_box == 0 and fpc[-1] == 0:
+            return 1.0, 1.0
+        has_tp = tps > 0
+        prev_tpc = tpc - tps
+        prev_fpc = fpc - fps
+        lower = np.where(has_tp, (prev_tpc + 1) / (prev_tpc + 1 + fpc), 0.0)
+        upper = np.where(has_tp, tpc / np.maximum(tpc + prev_fpc, 1), 0.0)
+        weights = tps / (self.n_gt_box + self.eps)
+        return (
+            float((weights * np.maximum.accumulate(lower[::-1])[::-1]).sum()),
+            float((weights * np.maximum.accumulate(upper[::-1])[::-1]).sum()),
+        )
 
     def __call__(self) -> float:
-        if self.n_gt_box == len(self.tp_list) == 0:
+        if self.bins is not None:
+            tps, fps, tpc, fpc = self._hist_curve()
+            if self.n_gt_box == tpc[-1] + fpc[-1] == 0:
+                return 1.0
+            has_box = (tps + fps) > 0
+            tpc = tpc[has_box]
+            fpc = fpc[has_box]
+            recall = tpc / (self.n_gt_box + self.eps)
+            precision = tpc / (tpc + fpc)
+            return auc(recall, precision)
+        tp, confidences = self._values()
+        if self.n_gt_box == len(tp) == 0:
             return 1.0
-        sort_indices = np.argsort(-np.concatenate(self.confidence_list))
-        tp = np.concatenate(self.tp_list)[sort_indices]
+        sort_indices = np.argsort(-confidences)
+        tp = tp[sort_indices]
         tpc = tp.cumsum()
         fpc = (1 - tp).cumsum()
         recall = tpc / (self.n_gt_box + self.eps)
@@ -0,0 +1,188 @@
+import numpy as np, torch
+from typing import Any, Dict, List, Tuple
+from torchvision.ops.boxes import box_iou, box_area
+from object_detection.entities import PascalBoxes, Labels, Confidences
+from object_detection.metrics.average_precision import auc
+
+AREA_NAMES = ["small", "medium", "large"]
+STATE_KEYS = ["tp", "confidences", "labels", "area_ids", "gt_area_ids"]
+
+
+def match_greedy_thresholds(
+    ious: Any,
+    matched_gt_ids: Any,
+    iou_thresholds: Any,
+) -> Any:
+    """
+    ious: [n_box] best iou of each box, boxes sorted by descending confidence
+    matched_gt_ids: [n_box] gt of the best iou
+    iou_thresholds: [T]
+    return: tp [T, n_box]
+        same rule as match_greedy, for every threshold at once.
+    """
+    n_box = len(ious)
+    order = np.argsort(matched_gt_ids, kind="stable")
+    sorted_gt_ids = matched_gt_ids[order]
+    qualified = ious[order][None] > iou_thresholds[:, None]
+    counts = qualified.cumsum(axis=1)
+    is_start = np.ones(n_box, dtype=bool)
+    is_start[1:] = sorted_gt_ids[1:] != sorted_gt_ids[:-1]
+    start_ids = np.maximum.accumulate(np.where(is_start, np.arange(n_box), 0))
+    before_start = counts[:, start_ids] - qualified[:, start_ids]
+    tp = np.zeros(qualified.shape, dtype=bool)
+    tp[:, order] = qualified & (counts - before_start == 1)
+    return tp
+
+
+class CocoMeanAveragePrecision:
+    """
+    mAP over several iou thresholds and by object size,
+    computing the iou matrix once per image.
+    a box matched to a gt of another size is ignored in that size's AP,
+    as is an unmatched box of another size.
+    classes without gt are left out of the mean. the mean is -1 when none has gt.
+    """
+
+    def __init__(
+        self,
+        num_classes: int,
+        iou_thresholds: List[float] = list(np.linspace(0.5, 0.95, 10)),
+        area_ranges: Tuple[float, float] = (32 ** 2, 96 ** 2),
+        eps: float = 1e-8,
+    ) -> None:
+        self.num_classes = num_classes
+        self.iou_thresholds = np.array(iou_thresholds)
+        self.area_ranges = np.array(area_ranges)
+        self.eps = eps
+        self.reset()
+
+    def reset(self) -> None:
+        self.tp_list: List[Any] = []
+        self.confidence_list: List[Any] = []
+        self.label_list: List[Any] = []
+        self.area_list: List[Any] = []
+        self.gt_area_list: List[Any] = []
+        self.n_gt_box = np.zeros((self.num_classes, len(AREA_NAMES)), dtype=np.int64)
+
+    def _area_ids(self, boxes: PascalBoxes) -> Any:
+        return np.searchsorted(
+            self.area_ranges, box_area(boxes).to("cpu").numpy(), side="right"
+        )
+
+    @torch.no_grad()
+    def add(
+        self,
+        boxes: PascalBoxes,
+        confidences: Confidences,
+        labels: Labels,
+        gt_boxes: PascalBoxes,
+        gt_labels: Labels,
+    ) -> None:
+        gt_area_ids = self._area_ids(gt_boxes)
+        np_gt_labels = gt_labels.to("cpu").numpy().astype(np.int64)
+        np.add.at(self.n_gt_box, (np_gt_labels, gt_area_ids), 1)
+        n_box = len(boxes)
+        if n_box == 0:
+            return
+        sort_indices = confidences.argsort(descending=True)
+        boxes = PascalBoxes(boxes[sort_indices])
+        labels = Labels(labels[sort_indices])
+        tp = np.zeros((len(self.iou_thresholds), n_box), dtype=bool)
+        gt_area = np.full(n_box, -1)
+        if len(gt_boxes) > 0:
+            # zero iou across classes keeps every match within a class
+            same_label = labels.view(-1, 1) == gt_labels.view(1, -1)
+            ious, matched_gt_ids = (box_iou(boxes, gt_boxes) * same_label).max(dim=1)
+            matched_gt_ids = matched_gt_ids.to("cpu").numpy()
+            tp = match_greedy_thresholds(
+                ious.to("cpu").numpy(), matched_gt_ids, self.iou_thresholds
+            )
+            gt_area = gt_area_ids[matched_gt_ids]
+        self.tp_list.append(tp)
+        self.confidence_list.append(confidences[sort_indices].to("cpu").numpy())
+        self.label_list.append(labels.to("cpu").numpy().astype(np.int64))
+        self.area_list.append(self._area_ids(boxes))
+        self.gt_area_list.append(gt_area)
+
+    def state_dict(self) -> Dict[str, Any]:
+        """
+        tp: [T, n_box] bool
+        confidences, labels, area_ids, gt_area_ids: [n_box]
+        n_gt_box: [num_classes, 3]
+        """
+        return dict(zip(STATE_KEYS, self._values()), n_gt_box=self.n_gt_box.copy())
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        self.reset()
+        self._load(state)
+
+    def merge(self, other: "CocoMeanAveragePrecision") -> None:
+        self._load(other.state_dict())
+
+    def _load(self, state: Dict[str, Any]) -> None:
+        self.n_gt_box += state["n_gt_box"]
+        self.tp_list.append(state["tp"])
+        self.confidence_list.append(state["confidences"])
+        self.label_list.append(state["labels"])
+        self.area_list.append(state["area_ids"])
+        self.gt_area_list.append(state["gt_area_ids"])
+
+    def _values(self) -> Tuple[Any, Any, Any, Any, Any]:
+        if len(self.tp_list) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            tp = np.zeros((len(self.iou_thresholds), 0), dtype=bool)
+            return tp, empty.astype(np.float32), empty, empty, empty
+        return (
+            np.concatenate(self.tp_list, axis=1),
+            np.concatenate(self.confidence_list),
+            np.concatenate(self.label_list),
+            np.concatenate(self.area_list),
+            np.concatenate(self.gt_area_list),
+        )
+
+    def _ap(self, tp: Any, n_gt_box: int) -> float:
+        tpc = tp.cumsum()
+        fpc = (~tp).cumsum()
+        recall = tpc / (n_gt_box + self.eps)
+        precision = tpc / (tpc + fpc)
+        return auc(recall, precision)
+
+    @torch.no_grad()
+    def __call__(self) -> Dict[str, float]:
+        """
+        return:
+            map: mean over iou thresholds
+            map_<threshold * 100>: per iou threshold, ex) map_50
+            map_small, map_medium, map_large: mean over iou thresholds per size
+        """
+        n_threshold = len(self.iou_thresholds)
+        aps = np.full((self.num_classes, n_threshold, len(AREA_NAMES) + 1), np.nan)
+        tp, confidences, labels, area_ids, gt_area_ids = self._values()
+        sort_indices = np.argsort(-confidences, kind="stable")
+        for k in range(self.num_classes):
+            ids = sort_indices[labels[sort_indices] == k]
+            for i in range(n_threshold):
+                class_tp = tp[i, ids]
+                if self.n_gt_box[k].sum() > 0:
+                    aps[k, i, 0] = self._ap(class_tp, self.n_gt_box[k].sum())
+                for area_id in range(len(AREA_NAMES)):
+                    if self.n_gt_box[k, area_id] == 0:
+                        continue
+                    area_tp = class_tp & (gt_area_ids[ids] == area_id)
+                    counted = area_tp | (~class_tp & (area_ids[ids] == area_id))
+                    aps[k, i, area_id + 1] = self._ap(
+                        area_tp[counted], self.n_gt_box[k, area_id]
+                    )
+
+        def mean(values: Any) -> float:
+            values = values[~np.isnan(values)]
+            return float(values.mean()) if len(values) > 0 else -1.0
+
+        # nan marks a class without gt, the same for every threshold
+        class_aps = aps.mean(axis=1)
+        res = {"map": mean(class_aps[:, 0])}
+        for i, threshold in enumerate(self.iou_thresholds):
+            res[f"map_{int(round(threshold * 100))}"] = mean(aps[:, i, 0])
+        for area_id, name in enumerate(AREA_NAMES):
+            res[f"map_{name}"] = mean(class_aps[:, area_id + 1])
+        return res
@@ -1,16 +1,29 @@
 import numpy as np, torch
-from typing import Tuple, List, Dict
+from typing import Any, Tuple, List, Dict, Optional
 from object_detection.metrics.average_precision import AveragePrecision
+from torchvision.ops.boxes import box_iou
 from object_detection.entities import PascalBoxes, Labels, Confidences
 
 
 class MeanAveragePrecision:
     def __init__(
-        self, num_classes: int, iou_threshold: float, eps: float = 1e-8
+        self,
+        num_classes: int,
+        iou_threshold: float,
+        eps: float = 1e-8,
+        bins: Optional[int] = None,
     ) -> None:
+        """
+        bins: keep a confidence histogram per class. see AveragePrecision.
+        """
         self.ap = AveragePrecision(iou_threshold, eps)
-        self.aps = {k: AveragePrecision(iou_threshold, eps) for k in range(num_classes)}
+        self.aps = {
+            k: AveragePrecision(iou_threshold, eps, bins=bins)
+            for k in range(num_classes)
+        }
+        self.iou_threshold = iou_threshold
         self.eps = eps
+        self.bins = bins
 
     def reset(self) -> None:
         for v in self.aps.values():
@@ -35,7 +48,123 @@ class MeanAveragePrecision:
                 gt_boxes=PascalBoxes(gt_boxes[gt_labels == k]),
             )
 
+    @torch.no_grad()
+    def add_batch(
+        self,
+        box_batch: List[PascalBoxes],
+        confidence_batch: List[Confidences],
+        label_batch: List[Labels],
+        gt_box_batch: List[PascalBoxes],
+        gt_label_batch: List[Labels],
+    ) -> None:
+        """
+        same as add for every image, with one device to host transfer.
+        """
+        if len(box_batch) == 0:
+            return
+        gt_offsets = np.cumsum([0] + [len(x) for x in gt_box_batch])
+        iou_list = []
+        gt_id_list = []
+        for boxes, labels, gt_boxes, gt_labels, gt_offset in zip(
+            box_batch, label_batch, gt_box_batch, gt_label_batch, gt_offsets
+        ):
+            if len(gt_boxes) == 0:
+                iou_list.append(torch.zeros(len(boxes), device=boxes.device))
+                gt_id_list.append(
+                    torch.full((len(boxes),), -1, dtype=torch.long, device=boxes.device)
+                )
+                continue
+            # zero iou across classes keeps every match within a class
+            same_label = labels.view(-1, 1) == gt_labels.view(1, -1)
+            ious, gt_ids = (box_iou(boxes, gt_boxes) * same_label).max(dim=1)
+            iou_list.append(ious)
+            gt_id_list.append(gt_ids + int(gt_offset))
+
+        box_count = sum(len(x) for x in box_batch)
+        box_values = [iou_list, gt_id_list, confidence_batch, label_batch]
+        tensors = [torch.cat(x).double() for x in box_values]  # type:ignore
+        tensors.append(torch.cat(gt_label_batch).double())  # type:ignore
+        values = torch.cat(tensors).to("cpu").numpy()
+        box_ious, box_gt_ids, box_confidences, box_labels = values[
+            : 4 * box_count
+        ].reshape(4, box_count)
+        gt_label_values = values[4 * box_count :].astype(np.int64)
+        image_ids = np.repeat(np.arange(len(box_batch)), [len(x) for x in box_batch])
+
+        # by class, then by image, then by descending confidence
+        sort_indices = np.lexsort((-box_confidences, image_ids, box_labels))
+        box_ious = box_ious[sort_indices]
+        box_gt_ids = box_gt_ids[sort_indices].astype(np.int64)
+        box_confidences = box_confidences[sort_indices]
+        box_labels = box_labels[sort_indices].astype(np.int64)
+        tp = np.zeros(len(sort_indices))
+        box_ids = np.nonzero(box_ious > self.iou_threshold)[0]
+        _, first_ids = np.unique(box_gt_ids[box_ids], return_index=True)
+        tp[box_ids[first_ids]] = 1
+
+        box_counts = np.bincount(box_labels, minlength=len(self.aps))
+        gt_counts = np.bincount(gt_label_values, minlength=len(self.aps))
+        box_offsets = np.cumsum(box_counts) - box_counts
+        for k, ap in self.aps.items():
+            ap.n_gt_box += int(gt_counts[k])
+            if box_counts[k] > 0:
+                start = box_offsets[k]
+                end = start + box_counts[k]
+                ap.append(tp[start:end], box_confidences[start:end])
+
+    def state_dict(self) -> Dict[str, Any]:
+        """
+        labels: [n_box]
+        tp: [n_box] bool
+        confidences: [n_box]
+        n_gt_box: [num_classes]
+        or with bins
+        tp_hist, fp_hist: [num_classes, bins]
+        n_gt_box: [num_classes]
+        """
+        states = {k: v.state_dict() for k, v in self.aps.items()}
+        if self.bins is not None:
+            return {
+                key: np.stack([np.asarray(v[key]) for v in states.values()])
+                for key in ["tp_hist", "fp_hist", "n_gt_box"]
+            }
+        return {
+            "labels": np.concatenate(
+                [np.full(len(v["tp"]), k) for k, v in states.items()]
+            ),
+            "tp": np.concatenate([v["tp"] for v in states.values()]),
+            "confidences": np.concatenate([v["confidences"] for v in states.values()]),
+            "n_gt_box": np.array([v["n_gt_box"] for v in states.values()]),
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        if self.bins is not None:
+            for k, v in self.aps.items():
+                v.load_state_dict({key: value[k] for key, value in state.items()})
+            return
+        for k, v in self.aps.items():
+            is_class = state["labels"] == k
+            v.load_state_dict(
+                {
+                    "tp": state["tp"][is_class],
+                    "confidences": state["confidences"][is_class],
+                    "n_gt_box": state["n_gt_box"][k],
+                }
+            )
+
+    def merge(self, other: "MeanAveragePrecision") -> None:
+        for k, v in self.aps.items():
+            v.merge(other.aps[k])
+
     @torch.no_grad()
     def __call__(self) -> Tuple[float, Dict[int, float]]:
         aps = {k: v() for k, v in self.aps.items()}
         return np.fromiter(aps.values(), dtype=float).mean(), aps
+
+    @torch.no_grad()
+    def bounds(self) -> Tuple[float, float]:
+        """
+        lower and upper bound of the exact mAP. see AveragePrecision.bounds
+        """
+        lower, upper = np.array([v.bounds() for v in self.aps.values()]).mean(axis=0)
+        return float(lower), float(upper)
@@ -3,6 +3,7 @@ import torch
 import numpy as np
 from collections import defaultdict
 from torch import Tensor
+from torch.nn.utils.rnn import pad_sequence
 from torchvision.ops.boxes import box_iou
 from object_detection.entities import (
     PascalBoxes,
@@ -19,6 +20,21 @@ def precition(iou_matrix: Tensor, threshold: float) -> float:
     return tp / (fp + tp + fn)
 
 
+def batched_box_iou(boxes1: Tensor, boxes2: Tensor) -> Tensor:
+    """
+    boxes1: [B, N, 4]
+    boxes2: [B, M, 4]
+    return: [B, N, M]
+    """
+    area1 = (boxes1[..., 2] - boxes1[..., 0]) * (boxes1[..., 3] - boxes1[..., 1])
+    area2 = (boxes2[..., 2] - boxes2[..., 0]) * (boxes2[..., 3] - boxes2[..., 1])
+    lt = torch.max(boxes1[:, :, None, :2], boxes2[:, None, :, :2])
+    rb = torch.min(boxes1[:, :, None, 2:], boxes2[:, None, :, 2:])
+    wh = (rb - lt).clamp(min=0)
+    inter = wh[..., 0] * wh[..., 1]
+    return inter / (area1[:, :, None] + area2[:, None, :] - inter)
+
+
 class MeanPrecition:
     def __init__(
         self,
@@ -46,3 +62,59 @@ class MeanPrecition:
         )
         res = np.mean([precition(iou_matrix, t) for t in self.iou_thresholds])
         return res
+
+    @torch.no_grad()
+    def batch(
+        self,
+        pred_box_batch: t.List[PascalBoxes],
+        gt_box_batch: t.List[PascalBoxes],
+    ) -> t.Tuple[float, t.List[float]]:
+        """
+        score a list of images at once.
+        return: mean over images, score per image
+        """
+        if len(gt_box_batch) == 0:
+            return 0.0, []
+        device = gt_box_batch[0].device
+        batch_size = len(gt_box_batch)
+        n_prs = torch.tensor([len(x) for x in pred_box_batch], device=device)
+        n_gts = torch.tensor([len(x) for x in gt_box_batch], device=device)
+        max_gt = max([len(x) for x in gt_box_batch] + [1])
+        pred_boxes = pad_sequence(
+            [x.float().view(-1, 4) for x in pred_box_batch], batch_first=True
+        )
+        gt_boxes = pad_sequence(
+            [x.float().view(-1, 4) for x in gt_box_batch], batch_first=True
+        )
+        pr_mask = torch.arange(pred_boxes.shape[1], device=device).view(
+            1, -1
+        ) < n_prs.view(-1, 1)
+        gt_mask = torch.arange(gt_boxes.shape[1], device=device).view(
+            1, -1
+        ) < n_gts.view(-1, 1)
+        iou_matrix = batched_box_iou(pred_boxes, gt_boxes).masked_fill(
+            ~(pr_mask[:, :, None] & gt_mask[:, None, :]), 0
+        )
+        if gt_boxes.shape[1] == 0:
+            iou_matrix = pred_boxes.new_zeros((batch_size, pred_boxes.shape[1], 1))
+        candidates, candidate_ids = iou_matrix.max(dim=2)  # [B, N]
+
+        # [B, T, N] a single comparison for every threshold
+        thresholds = torch.tensor(self.iou_thresholds, device=device)
+        is_match = candidates[:, None, :] > thresholds.view(1, -1, 1)
+        match_ids = torch.where(
+            is_match,
+            candidate_ids[:, None, :],
+            torch.full_like(candidate_ids, max_gt)[:, None, :],
+        )
+        hits = torch.zeros(
+            (batch_size, len(thresholds), max_gt + 1), device=device
+        ).scatter_(2, match_ids, 1)
+        tp = hits[..., :max_gt].sum(dim=2)
+        fp = n_prs.view(-1, 1) - tp
+        fn = n_gts.view(-1, 1) - tp
+        scores = (tp / (fp + tp + fn).clamp(min=1)).mean(dim=1)
+        # an image without gt scores 1 only when it has no predictions either
+        scores = torch.where(n_gts == 0, (n_prs == 0).float(), scores)
+        per_image = scores.to("cpu").tolist()
+        return float(np.mean(per_image)), per_image
@@ -13,6 +13,7 @@ from object_detection.entities import (
     yolo_clamp,
     box_clamp,
 )
+from .grid import mkgrid, LRUCache, GridKey
 
 
 class Anchors:
@@ -26,6 +27,7 @@ class Anchors:
             2 ** (1 / 2),
         ],
         use_cache: bool = True,
+        cache_size: int = 64,
     ) -> None:
         self.use_cache = use_cache
         pairs = torch.tensor(list(itertools.product(scales, ratios)))
@@ -34,20 +36,18 @@ class Anchors:
         self.scales = (
             pairs[:, 0].view(self.num_anchors, 1).expand((self.num_anchors, 2))
         ) * size
-        self.cache: Dict[Tuple[int, int], PascalBoxes] = {}
+        self.cache: LRUCache[GridKey, PascalBoxes] = LRUCache(cache_size)
 
     @torch.no_grad()
     def __call__(self, images: ImageBatch, stride: int) -> PascalBoxes:
         h, w = images.shape[2:]
         device = images.device
-        if self.use_cache and (h, w) in self.cache:
-            return self.cache[(h, w)]
-        grid_y, grid_x = torch.meshgrid(  # type:ignore
-            torch.arange(0, h, dtype=torch.float32, device=device) * stride
-            + stride // 2,
-            torch.arange(0, w, dtype=torch.float32, device=device) * stride
-            + stride // 2,
-        )
+        key = (h, w, stride, device, torch.float32)
+        if self.use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        grid_xy = mkgrid(h, w, stride, device=device)
         box_wh = torch.tensor([stride, stride])
         box_wh = self.ratios * self.scales * box_wh
         box_wh = (
@@ -55,10 +55,7 @@ class Anchors:
             .view(self.num_anchors, 2, 1, 1)
             .expand((self.num_anchors, 2, h, w))
         )
-        grid_x0y0 = (
-            torch.stack([grid_x, grid_y]).to(device).expand(self.num_anchors, 2, h, w)
-            - box_wh // 2
-        )
+        grid_x0y0 = grid_xy.expand(self.num_anchors, 2, h, w) - box_wh // 2
 
         grid_x1y1 = grid_x0y0 + box_wh
         boxes = (
@@ -69,7 +66,7 @@ class Anchors:
         )
         boxes = box_clamp(PascalBoxes(boxes), width=w * stride, height=h * stride)
         if self.use_cache:
-            self.cache[(h, w)] = boxes
+            self.cache.put(key, boxes)
         return boxes
 
 
@@ -79,21 +76,21 @@ class EmptyAnchors:
         use_cache: bool = True,
     ) -> None:
         self.use_cache = use_cache
-        self.cache: Dict[Tuple[int, int], BoxMap] = {}
+        self.cache: LRUCache[GridKey, BoxMap] = LRUCache()
 
     def __call__(self, ref_images: Tensor) -> BoxMap:
         h, w = ref_images.shape[-2:]
-        if self.use_cache:
-            if (h, w) in self.cache:
-                return self.cache[(h, w)]
         device = ref_images.device
-        grid_y, grid_x = torch.meshgrid(  # type:ignore
-            torch.arange(h, dtype=torch.float32) / h,
-            torch.arange(w, dtype=torch.float32) / w,
+        key = (h, w, 1, device, torch.float32)
+        if self.use_cache:
+            boxmap = self.cache.get(key)
+            if boxmap is not None:
+                return boxmap
+        grid_xy = mkgrid(h, w, device=device)
+        img_wh = torch.tensor([w, h], dtype=torch.float32, device=device)
+        boxmap = BoxMap(
+            torch.cat([grid_xy / img_wh.view(2, 1, 1), torch.zeros_like(grid_xy)])
         )
-        box_h = torch.zeros((h, w))
-        box_w = torch.zeros((h, w))
-        boxmap = BoxMap(torch.stack([grid_x, grid_y, box_w, box_h]).to(device))
         if self.use_cache:
-            self.cache[(h, w)] = boxmap
+            self.cache.put(key, boxmap)
         return boxmap
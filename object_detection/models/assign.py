@@ -17,8 +17,9 @@ class ClosestAssign:
         device = anchor.device
         gt_count = gt.shape[0]
         anchor_count = anchor.shape[0]
+        topk = min(self.topk, anchor_count)
         if gt_count == 0:
-            return torch.zeros((0, gt_count), device=device)
+            return torch.zeros((0, topk), dtype=torch.long, device=device)
         anchor_ctr = (
             ((anchor[:, :2] + anchor[:, 2:]) / 2.0)
             .view(anchor_count, 1, 2)
@@ -30,5 +31,29 @@ class ClosestAssign:
         )
         gt_ctr = gt[:, :2]
         matrix = ((anchor_ctr - gt_ctr) ** 2).sum(dim=-1).sqrt()
-        _, matched_idx = torch.topk(matrix, self.topk, dim=0, largest=False)
+        _, matched_idx = torch.topk(matrix, topk, dim=0, largest=False)
         return matched_idx.t()
+
+
+class LevelClosestAssign:
+    """
+    select k anchors per pyramid level whose center are closest to
+    the center of ground-truth based on L2 distance.
+    """
+
+    def __init__(self, topk: int) -> None:
+        self.topk = topk
+        self.assign = ClosestAssign(topk)
+
+    def __call__(
+        self, anchor_levels: typing.List[PascalBoxes], gt: PascalBoxes
+    ) -> Tensor:
+        """
+        return: [gt_count, topk * levels] indices of concatenated anchor_levels
+        """
+        matched_ids: typing.List[Tensor] = []
+        offset = 0
+        for anchors in anchor_levels:
+            matched_ids.append(self.assign(anchors, gt) + offset)
+            offset += len(anchors)
+        return torch.cat(matched_ids, dim=1)
@@ -1,10 +1,12 @@
 import torch
 from torch import Tensor
-from .assign import ClosestAssign
-from torchvision.ops.boxes import box_iou
+from .assign import LevelClosestAssign
+from .utils import rank_by_group
 from object_detection.entities import PascalBoxes, AnchorMap
 import typing
 
+Anchors = typing.Union[PascalBoxes, typing.List[PascalBoxes]]
+
 
 class ATSS:
     """
@@ -18,30 +20,81 @@ class ATSS:
     ) -> None:
         self.topk = topk
         self.pylamid_levels = pylamid_levels
-        self.assign = ClosestAssign(topk)
+        self.level_assign = LevelClosestAssign(topk)
 
     def __call__(
         self,
-        anchors: PascalBoxes,
+        anchors: Anchors,
         gt: PascalBoxes,
     ) -> Tensor:
+        """
+        anchors: concatenated anchors or anchors per pyramid level.
+            topk candidates are selected per level when levels are given.
+        return: [N, [gt_idx, anchor_idx]]
+        """
+        gt_ids, anchor_ids = self._select(
+            anchors, gt, torch.zeros(len(gt), dtype=torch.long, device=gt.device)
+        )
+        return torch.stack([gt_ids, anchor_ids], dim=1)
+
+    def batch(
+        self,
+        anchors: Anchors,
+        gt_boxes: Tensor,
+        gt_mask: Tensor,
+    ) -> Tensor:
+        """
+        gt_boxes: [B, max_gt, 4] padded ground-truths
+        gt_mask: [B, max_gt] True for valid ground-truths
+        return: [N, [batch_idx, gt_idx, anchor_idx]]
+        """
+        batch_ids, gt_ids = torch.nonzero(gt_mask, as_tuple=True)
+        pos_gt_ids, anchor_ids = self._select(
+            anchors, PascalBoxes(gt_boxes[batch_ids, gt_ids]), batch_ids
+        )
+        return torch.stack(
+            [batch_ids[pos_gt_ids], gt_ids[pos_gt_ids], anchor_ids], dim=1
+        )
+
+    def _select(
+        self,
+        anchors: Anchors,
+        gt: PascalBoxes,
+        batch_ids: Tensor,
+    ) -> typing.Tuple[Tensor, Tensor]:
+        if isinstance(anchors, list):
+            anchor_levels = anchors
+            anchors = PascalBoxes(torch.cat(anchor_levels, dim=0))  # type:ignore
+        else:
+            anchor_levels = [anchors]
         device = anchors.device
-        matched_ids = self.assign(anchors, gt)
-        gt_count, _ = matched_ids.shape
         anchor_count, _ = anchors.shape
-        pos_ids = torch.zeros(
-            (
-                gt_count,
-                anchor_count,
-            ),
-            device=device,
+        if len(gt) == 0:
+            empty = torch.zeros(0, dtype=torch.long, device=device)
+            return empty, empty
+        matched_ids = self.level_assign(anchor_levels, gt)  # [gt_count, topk * levels]
+        matched_anchors = anchors[matched_ids]
+        gt_boxes = gt.view(-1, 1, 4)
+        lt = torch.max(matched_anchors[..., :2], gt_boxes[..., :2])
+        rb = torch.min(matched_anchors[..., 2:], gt_boxes[..., 2:])
+        wh = (rb - lt).clamp(min=0)
+        inter = wh[..., 0] * wh[..., 1]
+        anchor_wh = matched_anchors[..., 2:] - matched_anchors[..., :2]
+        gt_wh = gt_boxes[..., 2:] - gt_boxes[..., :2]
+        ious = inter / (
+            anchor_wh[..., 0] * anchor_wh[..., 1]
+            + gt_wh[..., 0] * gt_wh[..., 1]
+            - inter
         )
-        for i in range(gt_count):
-            ids = matched_ids[i]
-            matched_anchors = anchors[ids]
-            ious = box_iou(matched_anchors, gt[[i]]).view(-1)
-            m_iou = ious.mean()
-            s_iou = ious.std()
-            th = m_iou + s_iou
-            pos_ids[i, ids[ious > th]] = True
-        return torch.nonzero(pos_ids, as_tuple=False)
+        th = ious.mean(dim=1, keepdim=True) + ious.std(dim=1, keepdim=True)
+        gt_ids, topk_ids = torch.nonzero(ious > th, as_tuple=True)
+        anchor_ids = matched_ids[gt_ids, topk_ids]
+
+        # an anchor selected by several ground-truths of the same image
+        # goes to the highest iou one
+        groups = batch_ids[gt_ids] * anchor_count + anchor_ids
+        keep = rank_by_group(ious[gt_ids, topk_ids], groups) == 0
+        gt_ids = gt_ids[keep]
+        anchor_ids = anchor_ids[keep]
+        sort_indices = (gt_ids * anchor_count + anchor_ids).argsort()
+        return gt_ids[sort_indices], anchor_ids[sort_indices]
@@ -0,0 +1,164 @@
+import torch
+import typing as t
+from typing_extensions import Literal
+from torch import Tensor
+from torchvision.ops.boxes import box_iou
+from object_detection.entities import (
+    PascalBoxes,
+    YoloBoxes,
+    Confidences,
+    Labels,
+    yolo_to_pascal,
+    pascal_to_yolo,
+)
+from .utils import grouped_nms
+
+BoxFormat = Literal["pascal", "yolo"]
+SoftNMSKernel = Literal["gaussian", "linear"]
+
+
+def _to_pascal(boxes: Tensor, box_format: BoxFormat) -> PascalBoxes:
+    # iou does not change with the scale of each axis, so yolo boxes are
+    # compared as pascal boxes of a 1x1 image
+    if box_format == "yolo":
+        return yolo_to_pascal(YoloBoxes(boxes), (1, 1))
+    return PascalBoxes(boxes)
+
+
+def _from_pascal(boxes: PascalBoxes, box_format: BoxFormat) -> Tensor:
+    if box_format == "yolo":
+        return pascal_to_yolo(boxes, (1, 1))
+    return boxes
+
+
+class WeightedBoxesFusion:
+    """
+    Weighted Boxes Fusion over the outputs of several models or TTA views.
+    clusters are the boxes an nms would suppress with each kept box, so they
+    come from one iou matrix instead of a sequential scan.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.55,
+        weights: t.Optional[t.List[float]] = None,
+        box_format: BoxFormat = "pascal",
+    ) -> None:
+        """
+        weights: per source confidence weight. all 1 when None.
+        """
+        self.iou_threshold = iou_threshold
+        self.weights = weights
+        self.box_format = box_format
+
+    @torch.no_grad()
+    def __call__(
+        self,
+        box_list: t.Sequence[Tensor],
+        confidence_list: t.List[Confidences],
+        label_list: t.List[Labels],
+    ) -> t.Tuple[Tensor, Confidences, Labels]:
+        """
+        box_list, confidence_list, label_list: one item per source for an image
+        """
+        source_count = len(box_list)
+        weights = torch.tensor(
+            self.weights or [1.0] * source_count, device=confidence_list[0].device
+        )
+        counts = torch.tensor([len(x) for x in box_list], device=weights.device)
+        boxes = _to_pascal(
+            torch.cat([x.float().view(-1, 4) for x in box_list]), self.box_format
+        )
+        confidences = torch.cat(confidence_list).float()  # type:ignore
+        confidences = confidences * torch.repeat_interleave(weights, counts)
+        labels = torch.cat(label_list)  # type:ignore
+        if len(boxes) == 0:
+            return (
+                _from_pascal(boxes, self.box_format),
+                Confidences(confidences),
+                Labels(labels),
+            )
+
+        leader_ids = grouped_nms(boxes, confidences, labels, self.iou_threshold)
+        # each box joins the most overlapping kept box of its class scored above it
+        ious = box_iou(boxes, boxes[leader_ids])
+        ious = ious * (labels.view(-1, 1) == labels[leader_ids].view(1, -1))
+        ious = ious * (confidences[leader_ids].view(1, -1) >= confidences.view(-1, 1))
+        cluster_ids = ious.argmax(dim=1)
+        cluster_ids[leader_ids] = torch.arange(len(leader_ids), device=boxes.device)
+
+        cluster_count = len(leader_ids)
+        confidence_sums = torch.zeros(cluster_count, device=boxes.device).index_add(
+            0, cluster_ids, confidences
+        )
+        fused_boxes = torch.zeros((cluster_count, 4), device=boxes.device).index_add(
+            0, cluster_ids, boxes * confidences.view(-1, 1)
+        ) / confidence_sums.clamp(min=1e-8).view(-1, 1)
+        box_counts = torch.bincount(cluster_ids, minlength=cluster_count).float()
+        # clusters found by fewer sources than there are get less confidence
+        fused_confidences = (
+            confidence_sums
+            / box_counts
+            * box_counts.clamp(max=source_count)
+            / weights.sum()
+        )
+        sort_ids = fused_confidences.argsort(descending=True)
+        return (
+            _from_pascal(PascalBoxes(fused_boxes[sort_ids]), self.box_format),
+            Confidences(fused_confidences[sort_ids]),
+            Labels(labels[leader_ids][sort_ids]),
+        )
+
+
+class SoftNMS:
+    """
+    soft-nms with the decay of every box from one iou matrix (Matrix NMS).
+    a box is decayed by the overlap with each higher scored box of its class,
+    compensated by how much that box was itself overlapped.
+    """
+
+    def __init__(
+        self,
+        sigma: float = 0.5,
+        kernel: SoftNMSKernel = "gaussian",
+        score_threshold: float = 0.001,
+        box_format: BoxFormat = "pascal",
+    ) -> None:
+        self.sigma = sigma
+        self.kernel = kernel
+        self.score_threshold = score_threshold
+        self.box_format = box_format
+
+    @torch.no_grad()
+    def __call__(
+        self,
+        boxes: Tensor,
+        confidences: Confidences,
+        labels: Labels,
+    ) -> t.Tuple[Tensor, Confidences, Labels]:
+        if len(boxes) == 0:
+            return boxes, confidences, labels
+        sort_ids = confidences.argsort(descending=True)
+        boxes = boxes[sort_ids]
+        confidences = Confidences(confidences[sort_ids])
+        labels = Labels(labels[sort_ids])
+        pascal_boxes = _to_pascal(boxes, self.box_format)
+
+        # ious[j, i]: box j scored higher than box i, same class
+        same_label = labels.view(-1, 1) == labels.view(1, -1)
+        ious = (box_iou(pascal_boxes, pascal_boxes) * same_label).triu(diagonal=1)
+        compensations = ious.max(dim=0)[0].view(-1, 1)
+        if self.kernel == "gaussian":
+            decays = torch.exp(-(ious ** 2 - compensations ** 2) / self.sigma)
+        else:
+            decays = (1 - ious) / (1 - compensations).clamp(min=1e-8)
+        scores = confidences * decays.min(dim=0)[0]
+
+        keep = scores > self.score_threshold
+        scores = scores[keep]
+        order = scores.argsort(descending=True)
+        return (
+            boxes[keep][order],
+            Confidences(scores[order]),
+            Labels(labels[keep][order]),
+        )
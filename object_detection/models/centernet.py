@@ -44,6 +44,7 @@ from .bifpn import BiFPN, FP
 from .losses import HuberLoss, DIoULoss
 from .anchors import EmptyAnchors
 from .matcher import NearnestMatcher, CenterMatcher
+from .utils import rank_by_group, grouped_nms, split_by_batch, box_cxcywh_to_xyxy
 from object_detection.meters import MeanMeter
 from object_detection.entities import (
     ImageBatch,
@@ -278,6 +279,58 @@ class BoxLoss:
         return torch.stack(box_losses).mean()
 
 
+def decode_batch(
+    kpmaps: Tensor,
+    labelmaps: Tensor,
+    boxmaps: Tensor,
+    anchormap: Tensor,
+    num_classes: int,
+    topk: int,
+    iou_threshold: float,
+    limit: int,
+    use_diff: bool,
+) -> t.Tuple[Tensor, Tensor, Tensor, Tensor]:
+    """
+    top-k peaks of every image and class-aware nms for the whole batch at once
+    kpmaps: [B, H, W] peak confidences, 0 elsewhere
+    labelmaps: [B, H, W]
+    return: (batch_ids, boxes, confidences, labels) of every kept box
+    """
+    batch_size, h, w = kpmaps.shape
+    topk = min(topk, h * w)
+    confidences, pos_idx = kpmaps.view(batch_size, -1).topk(topk, dim=1)
+    labels = labelmaps.view(batch_size, -1).gather(1, pos_idx)
+    boxes = boxmaps.view(batch_size, 4, -1).permute(0, 2, 1)
+    boxes = boxes.gather(1, pos_idx.unsqueeze(-1).expand(batch_size, topk, 4))
+    if use_diff:
+        boxes = boxes + anchormap.view(4, -1).t()[pos_idx]
+    batch_ids = (
+        torch.arange(batch_size, device=kpmaps.device)
+        .view(batch_size, 1)
+        .expand(batch_size, topk)
+    )
+
+    peak_indices = confidences > 0
+    confidences = confidences[peak_indices]
+    labels = labels[peak_indices]
+    boxes = boxes[peak_indices]
+    batch_ids = batch_ids[peak_indices]
+
+    groups = batch_ids * num_classes + labels
+    nms_indices = grouped_nms(
+        box_cxcywh_to_xyxy(boxes), confidences, groups, iou_threshold
+    )
+    nms_indices = nms_indices[
+        rank_by_group(confidences[nms_indices], groups[nms_indices]) < limit
+    ]
+    return (
+        batch_ids[nms_indices],
+        boxes[nms_indices],
+        confidences[nms_indices],
+        labels[nms_indices],
+    )
+
+
 class ToBoxes:
     def __init__(
         self,
@@ -286,12 +339,16 @@ class ToBoxes:
         kernel_size: int = 3,
         limit: int = 100,
         use_diff: bool = True,
+        use_batch: bool = False,
+        topk: int = 1000,
     ) -> None:
         self.limit = limit
         self.threshold = threshold
         self.kernel_size = kernel_size
         self.iou_threshold = iou_threshold
         self.use_diff = use_diff
+        self.use_batch = use_batch
+        self.topk = topk
         self.max_pool = partial(
             F.max_pool2d,
             kernel_size=kernel_size,
@@ -309,6 +366,10 @@ class ToBoxes:
             (self.max_pool(heatmaps) == heatmaps) & (heatmaps > self.threshold)
         )
         kpmaps, labelmaps = torch.max(kpmaps, dim=1)
+        if self.use_batch:
+            return self._batch_decode(
+                kpmaps, labelmaps, boxmaps, anchormap, heatmaps.shape[1]
+            )
 
         box_batch: t.List[YoloBoxes] = []
         confidence_batch: t.List[Confidences] = []
@@ -340,7 +401,7 @@ class ToBoxes:
                 c_confidences = confidences[cls_indices]
                 c_labels = labels[cls_indices]
                 nms_indices = nms(
-                    c_boxes,
+                    box_cxcywh_to_xyxy(c_boxes),
                     c_confidences,
                     self.iou_threshold,
                 )[: self.limit]
@@ -372,6 +433,33 @@ class ToBoxes:
             label_batch.append(Labels(labels))
         return box_batch, confidence_batch, label_batch
 
+    def _batch_decode(
+        self,
+        kpmaps: Tensor,
+        labelmaps: Tensor,
+        boxmaps: BoxMaps,
+        anchormap: BoxMap,
+        num_classes: int,
+    ) -> t.Tuple[t.List[YoloBoxes], t.List[Confidences], t.List[Labels]]:
+        batch_ids, boxes, confidences, labels = decode_batch(
+            kpmaps,
+            labelmaps,
+            boxmaps,
+            anchormap,
+            num_classes,
+            self.topk,
+            self.iou_threshold,
+            self.limit,
+            self.use_diff,
+        )
+        box_list, confidence_list, label_list = split_by_batch(
+            batch_ids, len(kpmaps), boxes, confidences, labels
+        )
+        box_batch = [YoloBoxes(x) for x in box_list]
+        confidence_batch = [Confidences(x) for x in confidence_list]
+        label_batch = [Labels(x) for x in label_list]
+        return box_batch, confidence_batch, label_batch
+
 
 class Visualize:
     def __init__(
@@ -0,0 +1,261 @@
+import inspect
+import torch
+import torch.nn.functional as F
+from torch import nn, Tensor
+from typing import Any, List, Tuple, TypeVar, Union
+from . import effidet, centernet
+from .modules import fix_same_padding
+from .optimize import optimize_for_inference
+from .utils import pad_by_batch
+
+# boxes [B, K, 4], scores [B, K], labels [B, K]
+Detections = Tuple[Tensor, Tensor, Tensor]
+
+M = TypeVar("M", bound=nn.Module)
+
+
+def _prepare(model: M, input_size: Tuple[int, int], fold_bn: bool) -> M:
+    model = optimize_for_inference(model, fold_bn=fold_bn)
+    device = next(model.parameters()).device
+    fix_same_padding(model, torch.zeros((1, 3, *input_size), device=device))
+    return model
+
+
+def _trace_backbone(backbone: nn.Module, input_size: Tuple[int, int]) -> nn.Module:
+    # the backbones wrap third party models which do not script.
+    # tracing fixes them to the input size, which the anchors are fixed to anyway.
+    device = next(backbone.parameters()).device
+    with torch.no_grad():
+        return torch.jit.trace(
+            backbone, torch.zeros((1, 3, *input_size), device=device)
+        )
+
+
+class EfficientDetPredictor(nn.Module):
+    """
+    EfficientDet and the batched ToBoxes decoding as one module for a fixed
+    input size, scriptable with torch.jit.script into a single artifact.
+    the backbone is traced and the rest is scripted.
+    return: padded (boxes, scores, labels), pascal boxes in pixels, -1 label as padding
+    """
+
+    __constants__ = ["out_ids"]
+    anchors: Tensor
+
+    def __init__(
+        self,
+        model: effidet.EfficientDet,
+        to_boxes: effidet.ToBoxes,
+        input_size: Tuple[int, int],
+        max_detections: int = 100,
+        fold_bn: bool = True,
+        trace_backbone: bool = True,
+    ) -> None:
+        """
+        input_size: (h, w)
+        fold_bn: fold BatchNorm into convs with optimize_for_inference
+        trace_backbone: for torch.jit.script. False to trace the whole module
+            at once, ex) torch.onnx.export
+        """
+        super().__init__()
+        model = _prepare(model, input_size, fold_bn)
+        model.precompute_anchors(input_size)
+        self.out_ids = [int(i) for i in model.out_ids]
+        self.register_buffer(
+            "anchors",
+            torch.cat(
+                [getattr(model, f"anchors_{i}") for i in range(len(self.out_ids))]
+            ),
+        )
+        self.backbone = (
+            _trace_backbone(model.backbone, input_size)
+            if trace_backbone
+            else model.backbone
+        )
+        # a Sequential of BiFPN passes tuples, which does not script
+        self.neck = nn.ModuleList(model.neck)
+        self.box_reg = model.box_reg
+        self.classification = model.classification
+        self.confidence_threshold = to_boxes.confidence_threshold
+        self.iou_threshold = to_boxes.iou_threshold
+        self.limit = to_boxes.limit
+        self.max_detections = max_detections
+
+    def forward(self, images: Tensor) -> Detections:
+        features = self.backbone(images)
+        for layer in self.neck:
+            features = layer(features)
+        box_levels: List[Tensor] = []
+        label_levels: List[Tensor] = []
+        for i in self.out_ids:
+            box_levels.append(self.box_reg(features[i]))
+            label_levels.append(self.classification(features[i]))
+        batch_ids, boxes, confidences, labels = effidet.decode_batch(
+            self.anchors,
+            torch.cat(box_levels, dim=1),
+            torch.cat(label_levels, dim=1),
+            self.confidence_threshold,
+            self.iou_threshold,
+            self.limit,
+        )
+        return pad_by_batch(
+            batch_ids, images.shape[0], self.max_detections, boxes, confidences, labels
+        )
+
+
+class CenterNetPredictor(nn.Module):
+    """
+    CenterNet and the batched ToBoxes decoding as one module for a fixed
+    input size, scriptable with torch.jit.script into a single artifact.
+    the backbone is traced and the rest is scripted.
+    return: padded (boxes, scores, labels), yolo boxes, -1 label as padding
+    """
+
+    __constants__ = ["out_idx"]
+    anchormap: Tensor
+
+    def __init__(
+        self,
+        model: centernet.CenterNet,
+        to_boxes: centernet.ToBoxes,
+        input_size: Tuple[int, int],
+        max_detections: int = 100,
+        fold_bn: bool = True,
+        trace_backbone: bool = True,
+    ) -> None:
+        """
+        input_size: (h, w)
+        fold_bn: fold BatchNorm into convs with optimize_for_inference
+        trace_backbone: for torch.jit.script. False to trace the whole module
+            at once, ex) torch.onnx.export
+        """
+        super().__init__()
+        model = _prepare(model, input_size, fold_bn)
+        device = next(model.parameters()).device
+        with torch.no_grad():
+            (heatmaps, _, anchormap), _ = model(
+                torch.zeros((1, 3, *input_size), device=device)
+            )
+        self.register_buffer("anchormap", anchormap.clone())
+        self.num_classes = heatmaps.shape[1]
+        self.out_idx = model.out_idx
+        self.backbone = (
+            _trace_backbone(model.backbone, input_size)
+            if trace_backbone
+            else model.backbone
+        )
+        self.fpn = nn.ModuleList(model.fpn)
+        self.hm_reg = model.hm_reg
+        self.box_reg = model.box_reg
+        self.threshold = to_boxes.threshold
+        self.kernel_size = to_boxes.kernel_size
+        self.iou_threshold = to_boxes.iou_threshold
+        self.limit = to_boxes.limit
+        self.use_diff = to_boxes.use_diff
+        self.topk = to_boxes.topk
+        self.max_detections = max_detections
+
+    def forward(self, images: Tensor) -> Detections:
+        features = self.backbone(images)
+        for layer in self.fpn:
+            features = layer(features)
+        feature = features[self.out_idx]
+        heatmaps = self.hm_reg(feature)
+        boxmaps = self.box_reg(feature)
+        peaks = F.max_pool2d(
+            heatmaps, self.kernel_size, stride=1, padding=self.kernel_size // 2
+        )
+        kpmaps = heatmaps * ((peaks == heatmaps) & (heatmaps > self.threshold))
+        kpmaps, labelmaps = torch.max(kpmaps, dim=1)
+        batch_ids, boxes, confidences, labels = centernet.decode_batch(
+            kpmaps,
+            labelmaps,
+            boxmaps,
+            self.anchormap,
+            self.num_classes,
+            self.topk,
+            self.iou_threshold,
+            self.limit,
+            self.use_diff,
+        )
+        return pad_by_batch(
+            batch_ids, images.shape[0], self.max_detections, boxes, confidences, labels
+        )
+
+
+def export_onnx(
+    model: Union[effidet.EfficientDet, centernet.CenterNet],
+    to_boxes: Union[effidet.ToBoxes, centernet.ToBoxes],
+    path: str,
+    input_size: Tuple[int, int],
+    max_detections: int = 100,
+    fold_bn: bool = True,
+    opset_version: int = 11,
+) -> nn.Module:
+    """
+    exports model and its ToBoxes decoding as one ONNX graph with a dynamic batch.
+    input: images [B, 3, H, W]
+    output: boxes [B, max_detections, 4], scores, labels as the predictors give
+    return: the exported predictor, to compare with
+    """
+    predictor: nn.Module
+    if isinstance(model, effidet.EfficientDet):
+        predictor = EfficientDetPredictor(
+            model,
+            to_boxes,  # type:ignore
+            input_size,
+            max_detections=max_detections,
+            fold_bn=fold_bn,
+            trace_backbone=False,
+        )
+    else:
+        predictor = CenterNetPredictor(
+            model,
+            to_boxes,  # type:ignore
+            input_size,
+            max_detections=max_detections,
+            fold_bn=fold_bn,
+            trace_backbone=False,
+        )
+    device = next(predictor.parameters()).device
+    export_module(
+        predictor,
+        (torch.zeros((1, 3, *input_size), device=device),),
+        path,
+        ["images"],
+        ["boxes", "scores", "labels"],
+        opset_version=opset_version,
+    )
+    return predictor
+
+
+def export_module(
+    module: nn.Module,
+    example_inputs: Tuple[Tensor, ...],
+    path: str,
+    input_names: List[str],
+    output_names: List[str],
+    opset_version: int = 11,
+) -> None:
+    """
+    traces module with example_inputs into an ONNX graph, the first axis of every
+    input and output dynamic as the batch.
+    tracing fixes python branches to example_inputs. the decoding does not branch
+    on the box count, so an example without any detection exports the same graph.
+    """
+    kwargs: Any = {}
+    # newer torch exports with dynamo by default, which does not take the
+    # data dependent shapes of the decoding
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            module,
+            example_inputs,
+            path,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes={name: {0: "batch"} for name in input_names + output_names},
+            opset_version=opset_version,
+            **kwargs,
+        )
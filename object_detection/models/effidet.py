@@ -23,6 +23,7 @@ from object_detection.utils import DetectionPlot
 from typing import Any, List, Tuple, NewType, Callable
 from torchvision.ops.boxes import box_iou
 from torch.utils.data import DataLoader
+from torch.nn.utils.rnn import pad_sequence
 from torchvision.ops import nms
 from torch import nn, Tensor
 from itertools import product as product
@@ -34,7 +35,7 @@ from torch.cuda.amp import GradScaler, autocast
 
 from .bottlenecks import SENextBottleneck2d
 from .bifpn import BiFPN, FP
-from .losses import DIoU, HuberLoss, DIoULoss, FocalLoss
+from .losses import DIoU, HuberLoss, DIoULoss, SparseFocalLoss
 from .modules import (
     ConvBR2d,
     SeparableConv2d,
@@ -44,6 +45,7 @@ from .modules import (
 )
 from .atss import ATSS
 from .anchors import Anchors
+from .utils import rank_by_group, grouped_nms, split_by_batch
 from .tta import VFlipTTA, HFlipTTA
 
 logger = getLogger(__name__)
@@ -221,10 +223,16 @@ class EfficientDet(nn.Module):
         fpn_depth: int = 1,
         box_depth: int = 1,
         cls_depth: int = 1,
+        input_size: t.Optional[Tuple[int, int]] = None,
     ) -> None:
+        """
+        input_size: (h, w) to precompute anchors of every level for.
+            forward skips anchor generation for inputs of this size.
+        """
         super().__init__()
         self.out_ids = np.array(out_ids) - 3
         self.anchors = anchors
+        self.input_size: t.Optional[Tuple[int, int]] = None
         self.backbone = backbone
         self.neck = nn.Sequential(*[BiFPN(channels=channels) for _ in range(fpn_depth)])
         self.box_reg = RegressionModel(
@@ -241,11 +249,36 @@ class EfficientDet(nn.Module):
         for n, m in self.named_modules():
             if "backbone" not in n:
                 _init_weight(m)
+        if input_size is not None:
+            self.precompute_anchors(input_size)
+
+    @torch.no_grad()
+    def precompute_anchors(self, input_size: Tuple[int, int]) -> None:
+        h, w = input_size
+        device = next(self.parameters()).device
+        training = self.training
+        self.eval()
+        features = self.neck(self.backbone(torch.zeros((1, 3, h, w), device=device)))
+        self.train(training)
+        for level, i in enumerate(self.out_ids):
+            self.register_buffer(
+                f"anchors_{level}",
+                self.anchors(features[i], 2 ** (i + 1)),
+                persistent=False,
+            )
+        self.input_size = (h, w)
 
     def forward(self, images: ImageBatch) -> NetOutput:
         features = self.backbone(images)
         features = self.neck(features)
-        anchor_levels = [self.anchors(features[i], 2 ** (i + 1)) for i in self.out_ids]
+        if self.input_size == tuple(images.shape[2:]):
+            anchor_levels = [
+                getattr(self, f"anchors_{level}") for level in range(len(self.out_ids))
+            ]
+        else:
+            anchor_levels = [
+                self.anchors(features[i], 2 ** (i + 1)) for i in self.out_ids
+            ]
         box_levels = [self.box_reg(features[i]) for i in self.out_ids]
         label_levels = [self.classification(features[i]) for i in self.out_ids]
         return (
@@ -266,9 +299,9 @@ class Criterion:
         self.num_classes = num_classes
         self.box_weight = box_weight
         self.cls_weight = cls_weight
-        self.box_loss = DIoULoss(size_average=True)
+        self.box_loss = DIoULoss(size_average=False)
         self.atss = ATSS(topk)
-        self.cls_loss = FocalLoss()
+        self.cls_loss = SparseFocalLoss()
 
     def __call__(
         self,
@@ -289,37 +322,42 @@ class Criterion:
         box_preds = torch.cat([*box_reg_levels], dim=1)
         cls_preds = torch.cat([*cls_pred_levels], dim=1)
 
-        box_losses = torch.zeros(batch_size, device=device)
-        cls_losses = torch.zeros(batch_size, device=device)
-        for batch_id, (gt_boxes, gt_lables, box_pred, cls_pred,) in enumerate(
-            zip(
-                gt_boxes_list,
-                gt_classes_list,
-                box_preds,
-                cls_preds,
-            )
-        ):
-            pos_ids = self.atss(
-                anchors,
-                PascalBoxes(gt_boxes),
+        # [B, max_gt, 4], [B, max_gt]
+        gt_boxes = pad_sequence(gt_boxes_list, batch_first=True)  # type:ignore
+        gt_labels = pad_sequence(gt_classes_list, batch_first=True)  # type:ignore
+        gt_labels = gt_labels.long()
+        gt_counts = torch.tensor(
+            [len(x) for x in gt_boxes_list], dtype=torch.long, device=device
+        )
+        gt_mask = torch.arange(gt_boxes.shape[1], device=device).view(
+            1, -1
+        ) < gt_counts.view(-1, 1)
+        batch_ids, gt_ids, anchor_ids = self.atss.batch(
+            anchor_levels, gt_boxes, gt_mask
+        ).unbind(-1)
+
+        matched_gt_boxes = gt_boxes[batch_ids, gt_ids]
+        matched_pred_boxes = anchors[anchor_ids] + box_preds[batch_ids, anchor_ids]
+
+        num_pos = gt_counts.clamp(min=1)
+        cls_losses = (
+            self.cls_loss(
+                cls_preds.float(),
+                (batch_ids, anchor_ids, gt_labels[batch_ids, gt_ids]),
             )
-            matched_gt_boxes = gt_boxes[pos_ids[:, 0]]
-            matched_pred_boxes = anchors[pos_ids[:, 1]] + box_pred[pos_ids[:, 1]]
-            cls_target = torch.zeros(cls_pred.shape, device=device)
-            cls_target[pos_ids[:, 1], gt_lables[pos_ids[:, 0]].long()] = 1
-
-            num_pos = max(len(gt_boxes), 1)
-            cls_losses[batch_id] = (
-                self.cls_loss(
-                    cls_pred.float(),
-                    cls_target.float(),
-                ).sum()
-                / num_pos
+            / num_pos
+        )
+        box_losses = (
+            torch.zeros(batch_size, device=device).index_add(
+                0,
+                batch_ids,
+                self.box_loss(
+                    PascalBoxes(matched_gt_boxes),
+                    PascalBoxes(matched_pred_boxes),
+                ),
             )
-            box_losses[batch_id] = self.box_loss(
-                PascalBoxes(matched_gt_boxes),
-                PascalBoxes(matched_pred_boxes),
-            ).mean()
+            / torch.bincount(batch_ids, minlength=batch_size).clamp(min=1)
+        )
 
         box_loss = box_losses.mean() * self.box_weight
         cls_loss = cls_losses.mean() * self.cls_weight
@@ -366,16 +404,56 @@ class PreProcess:
         )
 
 
+def decode_batch(
+    anchors: Tensor,
+    box_diffs: Tensor,
+    preds: Tensor,
+    confidence_threshold: float,
+    iou_threshold: float,
+    limit: int,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    """
+    threshold, per-class top-k and class-aware nms for the whole batch at once
+    anchors: [N, 4]
+    box_diffs: [B, N, 4]
+    preds: [B, N, num_classes]
+    return: (batch_ids, boxes, confidences, labels) of every kept box
+    """
+    batch_size, _, num_classes = preds.shape
+    confidences, labels = preds.max(dim=2)
+    batch_ids, anchor_ids = (confidences > confidence_threshold).nonzero().unbind(1)
+    confidences = confidences[batch_ids, anchor_ids]
+    labels = labels[batch_ids, anchor_ids]
+    boxes = anchors[anchor_ids] + box_diffs[batch_ids, anchor_ids]
+
+    groups = batch_ids * num_classes + labels
+    topk_indices = rank_by_group(confidences, groups) < limit
+    nms_indices = grouped_nms(
+        boxes[topk_indices],
+        confidences[topk_indices],
+        groups[topk_indices],
+        iou_threshold,
+    )
+    return (
+        batch_ids[topk_indices][nms_indices],
+        boxes[topk_indices][nms_indices],
+        confidences[topk_indices][nms_indices],
+        labels[topk_indices][nms_indices],
+    )
+
+
 class ToBoxes:
     def __init__(
         self,
         confidence_threshold: float = 0.5,
         iou_threshold: float = 0.5,
         limit: int = 1000,
+        use_batch: bool = False,
     ) -> None:
         self.confidence_threshold = confidence_threshold
         self.iou_threshold = iou_threshold
         self.limit = limit
+        self.use_batch = use_batch
 
     @torch.no_grad()
     def __call__(
@@ -392,6 +470,8 @@ class ToBoxes:
         anchors = torch.cat(anchor_levels, dim=0)  # type: ignore
         box_diffs = torch.cat(box_diff_levels, dim=1)  # type:ignore
         labels_batch = torch.cat(labels_levels, dim=1)  # type:ignore
+        if self.use_batch:
+            return self._batch_decode(anchors, box_diffs, labels_batch)
         for box_diff, preds in zip(box_diffs, labels_batch):
             boxes = anchors + box_diff
             confidences, labels = preds.max(dim=1)
@@ -448,3 +528,22 @@ class ToBoxes:
             confidence_batch.append(Confidences(confidences))
             label_batch.append(Labels(labels))
         return box_batch, confidence_batch, label_batch
+
+    def _batch_decode(
+        self, anchors: Tensor, box_diffs: Tensor, preds: Tensor
+    ) -> t.Tuple[List[PascalBoxes], List[Confidences], List[Labels]]:
+        batch_ids, boxes, confidences, labels = decode_batch(
+            anchors,
+            box_diffs,
+            preds,
+            self.confidence_threshold,
+            self.iou_threshold,
+            self.limit,
+        )
+        box_list, confidence_list, label_list = split_by_batch(
+            batch_ids, len(preds), boxes, confidences, labels
+        )
+        box_batch = [PascalBoxes(x) for x in box_list]
+        confidence_batch = [Confidences(x) for x in confidence_list]
+        label_batch = [Labels(x) for x in label_list]
+        return box_batch, confidence_batch, label_batch
@@ -4,6 +4,7 @@ from torch import nn
 from object_detection.entities import ImageBatch
 from .bifpn import BiFPN, FP
 from .losses import SigmoidFocalLoss, DIoULoss
+from .grid import mkgrid
 
 
 FocsBoxes = typing.NewType("FocsBoxes", torch.Tensor)
@@ -172,7 +173,6 @@ class FCOS(nn.Module):
 
 
 class Anchor:
-    # TODO add size cache
     def __init__(self, strides: typing.List[int] = [1, 2, 4]) -> None:
         self.strides = strides
 
@@ -187,25 +187,8 @@ class Anchor:
     def loc_per_level(
         self, height: int, width: int, stride: int, device: typing.Any
     ) -> Location:
-        shift_x = torch.arange(
-            0,
-            width * stride,
-            step=stride,
-            dtype=torch.float32,
-            device=device,
-        )
-        shift_y = torch.arange(
-            0,
-            height * stride,
-            step=stride,
-            dtype=torch.float32,
-            device=device,
-        )
-        shift_y, shift_x = torch.meshgrid(shift_y, shift_x)
-        shift_x = shift_x.reshape(-1)
-        shift_y = shift_y.reshape(-1)
-        loc = torch.stack((shift_x, shift_y), 1) + stride // 2
-        return Location(loc)
+        grid = mkgrid(height, width, stride, device=device)
+        return Location(grid.view(2, -1).t())
 
 
 class TrainBench:
@@ -0,0 +1,65 @@
+import torch
+import typing as t
+from collections import OrderedDict
+from torch import Tensor
+
+K = t.TypeVar("K")
+V = t.TypeVar("V")
+
+GridKey = t.Tuple[int, int, int, torch.device, torch.dtype]
+
+
+class LRUCache(t.Generic[K, V]):
+    """
+    dict bounded to maxsize entries. the least recently used one is evicted.
+    """
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[K, V]" = OrderedDict()
+
+    def get(self, key: K) -> t.Optional[V]:
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key: K, value: V) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+grid_cache: LRUCache[GridKey, Tensor] = LRUCache()
+
+
+def mkgrid(
+    h: int,
+    w: int,
+    stride: int = 1,
+    device: t.Any = "cpu",
+    dtype: torch.dtype = torch.float32,
+) -> Tensor:
+    """
+    return: [2, h, w] (x, y) of cell centers, arange * stride + stride // 2
+        shared through grid_cache. do not modify it in place.
+    """
+    device = torch.device(device)
+    key = (h, w, stride, device, dtype)
+    grid = grid_cache.get(key)
+    if grid is not None:
+        return grid
+    grid_y, grid_x = torch.meshgrid(  # type:ignore
+        torch.arange(h, dtype=dtype, device=device) * stride + stride // 2,
+        torch.arange(w, dtype=dtype, device=device) * stride + stride // 2,
+    )
+    grid = torch.stack([grid_x, grid_y])
+    grid_cache.put(key, grid)
+    return grid
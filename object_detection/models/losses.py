@@ -85,6 +85,50 @@ class FocalLoss:
         return loss
 
 
+class SparseFocalLoss:
+    """
+    FocalLoss with positives given as indices instead of a dense 0/1 target.
+    the negative term is evaluated on the whole prediction once and
+    only the positive entries are corrected.
+    """
+
+    def __init__(
+        self,
+        gamma: float = 2.0,
+        eps: float = 1e-4,
+        alpha: float = 0.25,
+    ):
+        self.gamma = gamma
+        self.eps = eps
+        self.alpha = alpha
+
+    def __call__(self, pred: Tensor, pos_indices: t.Sequence[Tensor]) -> Tensor:
+        """
+        pred:
+            value_range: 0-1
+            shape: [N, C,..]
+        pos_indices:
+            one index tensor per dim of pred. ex) (batch_ids, anchor_ids, class_ids)
+        return:
+            loss summed per sample [N]
+        """
+        gamma = self.gamma
+        alpha = self.alpha
+        pred = torch.clamp(pred, min=self.eps, max=1 - self.eps)
+        neg_loss = -(pred ** gamma) * torch.log(1 - pred)
+        neg_losses = (1 - alpha) * neg_loss.flatten(1).sum(dim=1)
+        if len(pos_indices[0]) == 0:
+            return neg_losses
+
+        # a positive listed twice is still a single 1 in the dense target
+        unique_ids = torch.unique(torch.stack(list(pos_indices), dim=1), dim=0)
+        pos_indices = unique_ids.unbind(1)
+        pos_pred = pred[pos_indices]
+        pos_loss = -((1 - pos_pred) ** gamma) * torch.log(pos_pred)
+        pos_losses = alpha * pos_loss - (1 - alpha) * neg_loss[pos_indices]
+        return neg_losses.index_add(0, pos_indices[0], pos_losses)
+
+
 class IoU:
     def __call__(
         self, boxes1: PascalBoxes, boxes2: PascalBoxes
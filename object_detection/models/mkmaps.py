@@ -1,7 +1,9 @@
-from typing import Tuple, List, Callable, NewType
+from typing import Tuple, List, Callable, NewType, Optional
 from typing_extensions import Literal
 import torch
 from object_detection.entities import YoloBoxes, BoxMaps, Labels
+from .utils import rank_by_group
+from .grid import mkgrid
 
 Heatmaps = NewType("Heatmaps", torch.Tensor)  # [B, C, H, W]
 MkMapsFn = Callable[
@@ -58,10 +60,111 @@ class MkGaussianMaps(MkMapsBase):
         num_classes: int,
         sigma: float = 0.5,
         mode: GaussianMapMode = "length",
+        truncate: Optional[float] = None,
+        use_batch: bool = False,
     ) -> None:
+        """
+        truncate: render each gaussian only within truncate * std of its center.
+            the whole map is rendered per box when None.
+        use_batch: render all images and classes at once.
+        """
         self.sigma = sigma
         self.mode = mode
         self.num_classes = num_classes
+        self.truncate = truncate
+        self.use_batch = use_batch
+
+    def _weight(self, boxes: YoloBoxes) -> torch.Tensor:
+        if self.mode == "aspect":
+            return (boxes[:, 2:] ** 2).clamp(min=1e-4)
+        if self.mode == "length":
+            return (boxes[:, 2:] ** 2).min(dim=1, keepdim=True)[0].clamp(min=1e-4)
+        return torch.ones((len(boxes), 1), device=boxes.device)
+
+    @torch.no_grad()
+    def __call__(
+        self,
+        box_batch: List[YoloBoxes],
+        label_batch: List[Labels],
+        hw: Tuple[int, int],
+        original_hw: Tuple[int, int],
+    ) -> Heatmaps:
+        if self.use_batch:
+            return self._batch(box_batch, label_batch, hw, original_hw)
+        return super().__call__(box_batch, label_batch, hw, original_hw)
+
+    def _batch(
+        self,
+        box_batch: List[YoloBoxes],
+        label_batch: List[Labels],
+        hw: Tuple[int, int],
+        original_hw: Tuple[int, int],
+    ) -> Heatmaps:
+        batch_size = len(box_batch)
+        h, w = hw
+        boxes = YoloBoxes(torch.cat(box_batch, dim=0))  # type:ignore
+        labels = torch.cat(label_batch, dim=0).long()  # type:ignore
+        box_counts = torch.tensor([len(x) for x in box_batch], device=boxes.device)
+        batch_ids = torch.repeat_interleave(
+            torch.arange(batch_size, device=boxes.device), box_counts
+        )
+        heatmaps = self._mkmaps_batch(
+            boxes,
+            batch_ids * self.num_classes + labels,
+            batch_size * self.num_classes,
+            hw,
+            original_hw,
+        )
+        return Heatmaps(heatmaps.view(batch_size, self.num_classes, h, w))
+
+    def _mkmaps_batch(
+        self,
+        boxes: YoloBoxes,
+        map_ids: torch.Tensor,
+        map_count: int,
+        hw: Tuple[int, int],
+        original_hw: Tuple[int, int],
+    ) -> Heatmaps:
+        """
+        map_ids: [box_count] index of the map each box is rendered on
+        return: [map_count, 1, H, W]
+        """
+        device = boxes.device
+        h, w = hw
+        heatmaps = torch.zeros(map_count * h * w, dtype=torch.float32, device=device)
+        img_wh = torch.tensor([w, h], device=device)
+        cxcy = (boxes[:, :2] * img_wh).long()
+        weight = self._weight(boxes).expand(len(boxes), 2)
+        if self.truncate is None:
+            radius = img_wh.expand(len(boxes), 2)
+        else:
+            radius = (self.truncate * self.sigma * weight.sqrt()).ceil().long()
+            radius = torch.min(radius, img_wh)
+        lt = (cxcy - radius).clamp(min=0)
+        rb = torch.min(cxcy + radius, img_wh - 1)
+        window_wh = (rb - lt + 1).clamp(min=0)
+        window_sizes = window_wh[:, 0] * window_wh[:, 1]
+
+        # one entry per pixel of every window
+        box_ids = torch.repeat_interleave(
+            torch.arange(len(boxes), device=device), window_sizes
+        )
+        offsets = (
+            torch.arange(len(box_ids), device=device)
+            - (window_sizes.cumsum(0) - window_sizes)[box_ids]
+        )
+        window_w = window_wh[box_ids, 0]
+        grid_xy = lt[box_ids] + torch.stack(
+            [offsets % window_w, offsets // window_w], dim=1
+        )
+        mounts = torch.exp(
+            -(((grid_xy - cxcy[box_ids]) ** 2) / weight[box_ids]).sum(dim=1)
+            / (2 * self.sigma ** 2)
+        )
+        pixel_ids = (map_ids[box_ids] * h + grid_xy[:, 1]) * w + grid_xy[:, 0]
+        is_max = rank_by_group(mounts, pixel_ids) == 0
+        heatmaps[pixel_ids[is_max]] = mounts[is_max]
+        return Heatmaps(heatmaps.view(map_count, 1, h, w))
 
     def _mkmaps(
         self,
@@ -76,29 +179,20 @@ class MkGaussianMaps(MkMapsBase):
         box_count = len(boxes)
         if box_count == 0:
             return Heatmaps(heatmap)
+        if self.truncate is not None:
+            map_ids = torch.zeros(box_count, dtype=torch.long, device=device)
+            return self._mkmaps_batch(boxes, map_ids, 1, hw, original_hw)
 
-        grid_y, grid_x = torch.meshgrid(  # type:ignore
-            torch.arange(h, dtype=torch.int64),
-            torch.arange(w, dtype=torch.int64),
-        )
         img_wh = torch.tensor([w, h]).to(device)
         cxcy = boxes[:, :2] * img_wh
         box_wh = boxes[:, 2:]
         cx = cxcy[:, 0]
         cy = cxcy[:, 1]
-        grid_xy = torch.stack([grid_x, grid_y]).to(device).expand((box_count, 2, h, w))
+        grid_xy = mkgrid(h, w, device=device, dtype=torch.int64).expand(
+            (box_count, 2, h, w)
+        )
         grid_cxcy = cxcy.view(box_count, 2, 1, 1).expand_as(grid_xy)
-        if self.mode == "aspect":
-            weight = (boxes[:, 2:] ** 2).clamp(min=1e-4).view(box_count, 2, 1, 1)
-        elif self.mode == "length":
-            weight = (
-                (boxes[:, 2:] ** 2)
-                .min(dim=1, keepdim=True)[0]
-                .clamp(min=1e-4)
-                .view(box_count, 1, 1, 1)
-            )
-        else:
-            weight = torch.ones((box_count, 1, 1, 1)).to(device)
+        weight = self._weight(boxes).view(box_count, -1, 1, 1)
         mounts = torch.exp(
             -(((grid_xy - grid_cxcy.long()) ** 2) / weight).sum(dim=1, keepdim=True)
             / (2 * self.sigma ** 2)
@@ -126,16 +220,14 @@ class MkFillMaps(MkMapsBase):
         if box_count == 0:
             return Heatmaps(heatmap)
 
-        grid_y, grid_x = torch.meshgrid(  # type:ignore
-            torch.arange(h, dtype=torch.int64),
-            torch.arange(w, dtype=torch.int64),
-        )
         img_wh = torch.tensor([w, h]).to(device)
         cxcy = boxes[:, :2] * img_wh
         box_wh = boxes[:, 2:]
         cx = cxcy[:, 0]
         cy = cxcy[:, 1]
-        grid_xy = torch.stack([grid_x, grid_y]).to(device).expand((box_count, 2, h, w))
+        grid_xy = mkgrid(h, w, device=device, dtype=torch.int64).expand(
+            (box_count, 2, h, w)
+        )
         grid_cxcy = cxcy.view(box_count, 2, 1, 1).expand_as(grid_xy)
         grid_wh = img_wh.view(1, 2, 1, 1).expand_as(grid_xy)
         min_wh = (1.0 / img_wh.float()).view(1, 2).expand_as(box_wh)
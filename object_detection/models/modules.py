@@ -21,6 +21,13 @@ class SwishImplementation(torch.autograd.Function):
 
 class MemoryEfficientSwish(nn.Module):
     def forward(self, x: Tensor) -> Tensor:
+        # autograd Functions do not script, and scripted graphs are for inference
+        if torch.jit.is_scripting():
+            return x * torch.sigmoid(x)
+        return self._function_forward(x)
+
+    @torch.jit.unused
+    def _function_forward(self, x: Tensor) -> Tensor:
         return SwishImplementation.apply(x)
 
 
@@ -53,7 +60,7 @@ class Swish(nn.Module):
     def __init__(self) -> None:
         super().__init__()
 
-    def forward(self, x):  # type:ignore
+    def forward(self, x: Tensor) -> Tensor:
         return x * torch.sigmoid(x)
 
 
@@ -62,7 +69,7 @@ class Hswish(nn.Module):
         super().__init__()
         self.inplace = inplace
 
-    def forward(self, x):  # type: ignore
+    def forward(self, x: Tensor) -> Tensor:
         return x * F.relu6(x + 3.0, inplace=self.inplace) / 6.0
 
 
@@ -71,7 +78,7 @@ class Hsigmoid(nn.Module):
         super().__init__()
         self.inplace = inplace
 
-    def forward(self, x):  # type:ignore
+    def forward(self, x: Tensor) -> Tensor:
         return F.relu6(x + 3.0, inplace=self.inplace) / 6.0
 
 
@@ -86,7 +93,7 @@ class CSE2d(nn.Module):
             Hsigmoid(inplace=True),
         )
 
-    def forward(self, x):  # type: ignore
+    def forward(self, x: Tensor) -> Tensor:
         x = x * self.se(x)
         return x
 
@@ -122,7 +129,32 @@ class ConvBR2d(nn.Module):
         return x
 
 
+def same_padding(
+    size: List[int], kernel_size: List[int], stride: List[int]
+) -> List[int]:
+    """
+    size: [h, w]
+    return: [left, right, top, bottom] of tensorflow's SAME padding
+    """
+    h, w = size[0], size[1]
+    extra_h = (math.ceil(w / stride[1]) - 1) * stride[1] - w + kernel_size[1]
+    extra_v = (math.ceil(h / stride[0]) - 1) * stride[0] - h + kernel_size[0]
+    left = extra_h // 2
+    top = extra_v // 2
+    return [left, extra_h - left, top, extra_v - top]
+
+
 class Conv2dStaticSamePadding(nn.Module):
+    """
+    with stride 1 and an odd kernel the padding is the same on every side
+    for any input, so the conv pads by itself and forward is the conv alone.
+    otherwise the padding is computed per forward, or once by set_input_size.
+    """
+
+    folded: bool
+    input_size: List[int]
+    static_padding: List[int]
+
     def __init__(
         self,
         in_channels: int,
@@ -134,6 +166,7 @@ class Conv2dStaticSamePadding(nn.Module):
         dilation: int = 1,
     ) -> None:
         super().__init__()
+        self.folded = stride == 1 and kernel_size % 2 == 1
         self.conv = nn.Conv2d(
             in_channels,
             out_channels,
@@ -141,33 +174,31 @@ class Conv2dStaticSamePadding(nn.Module):
             stride=stride,
             bias=bias,
             groups=groups,
+            padding=kernel_size // 2 if self.folded else 0,
         )
-        self.stride = (stride, stride)
-        self.kernel_size = (kernel_size, kernel_size)
-
-    def forward(self, x: Tensor) -> Tensor:
-        h, w = x.shape[-2:]
-
-        extra_h = (
-            (math.ceil(w / self.stride[1]) - 1) * self.stride[1]
-            - w
-            + self.kernel_size[1]
+        self.stride = [stride, stride]
+        self.kernel_size = [kernel_size, kernel_size]
+        self.input_size = []
+        self.static_padding = []
+
+    def set_input_size(self, input_size: List[int]) -> None:
+        """
+        input_size: [h, w] the padding is computed once for
+        """
+        self.input_size = list(input_size)
+        self.static_padding = same_padding(
+            self.input_size, self.kernel_size, self.stride
         )
-        extra_v = (
-            (math.ceil(h / self.stride[0]) - 1) * self.stride[0]
-            - h
-            + self.kernel_size[0]
-        )
-
-        left = extra_h // 2
-        right = extra_h - left
-        top = extra_v // 2
-        bottom = extra_v - top
-
-        x = F.pad(x, [left, right, top, bottom])
 
-        x = self.conv(x)
-        return x
+    def forward(self, x: Tensor) -> Tensor:
+        if self.folded:
+            return self.conv(x)
+        size = [x.shape[-2], x.shape[-1]]
+        if size == self.input_size:
+            padding = self.static_padding
+        else:
+            padding = same_padding(size, self.kernel_size, self.stride)
+        return self.conv(F.pad(x, padding))
 
 
 class SeparableConv2d(nn.Module):
@@ -223,32 +254,61 @@ class SeparableConvBR2d(nn.Module):
 
 
 class MaxPool2dStaticSamePadding(nn.Module):
+    """
+    pads with zeros, not -inf as nn.MaxPool2d does, so the padding stays
+    outside the pool. it is computed per forward, or once by set_input_size.
+    """
+
+    input_size: List[int]
+    static_padding: List[int]
+
     def __init__(self, kernel_size: int, stride: int) -> None:
         super().__init__()
         self.pool = nn.MaxPool2d(kernel_size=kernel_size, stride=stride)
 
-        self.stride = (stride, stride)
-        self.kernel_size = (kernel_size, kernel_size)
-
-    def forward(self, x: Tensor) -> Tensor:
-        h, w = x.shape[-2:]
-        extra_h = (
-            (math.ceil(w / self.stride[1]) - 1) * self.stride[1]
-            - w
-            + self.kernel_size[1]
+        self.stride = [stride, stride]
+        self.kernel_size = [kernel_size, kernel_size]
+        self.input_size = []
+        self.static_padding = []
+
+    def set_input_size(self, input_size: List[int]) -> None:
+        """
+        input_size: [h, w] the padding is computed once for
+        """
+        self.input_size = list(input_size)
+        self.static_padding = same_padding(
+            self.input_size, self.kernel_size, self.stride
         )
-        extra_v = (
-            (math.ceil(h / self.stride[0]) - 1) * self.stride[0]
-            - h
-            + self.kernel_size[0]
-        )
-
-        left = extra_h // 2
-        right = extra_h - left
-        top = extra_v // 2
-        bottom = extra_v - top
 
-        x = F.pad(x, [left, right, top, bottom])
-
-        x = self.pool(x)
-        return x
+    def forward(self, x: Tensor) -> Tensor:
+        size = [x.shape[-2], x.shape[-1]]
+        if size == self.input_size:
+            padding = self.static_padding
+        else:
+            padding = same_padding(size, self.kernel_size, self.stride)
+        return self.pool(F.pad(x, padding))
+
+
+@torch.no_grad()
+def fix_same_padding(model: nn.Module, *inputs: Any) -> None:
+    """
+    fixes the padding of every *StaticSamePadding in model to the sizes
+    they get from one dry forward of inputs.
+    other sizes are still padded per forward.
+    """
+    hooks = []
+    for m in model.modules():
+        if isinstance(m, (Conv2dStaticSamePadding, MaxPool2dStaticSamePadding)):
+            hooks.append(
+                m.register_forward_pre_hook(
+                    lambda m, x: m.set_input_size(list(x[0].shape[-2:]))
+                )
+            )
+    training = model.training
+    model.eval()
+    try:
+        model(*inputs)
+    finally:
+        for hook in hooks:
+            hook.remove()
+        model.train(training)
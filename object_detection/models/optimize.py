@@ -0,0 +1,116 @@
+import copy
+import torch
+from torch import nn
+from typing import Dict, List, Tuple, Type, TypeVar
+from efficientnet_pytorch.model import EfficientNet, MBConvBlock
+from torchvision.models.resnet import BasicBlock, Bottleneck
+from .modules import (
+    ConvBR2d,
+    Conv2dStaticSamePadding,
+    SeparableConvBR2d,
+    MemoryEfficientSwish,
+    Swish,
+)
+
+M = TypeVar("M", bound=nn.Module)
+
+# (conv, batchnorm) attribute paths folded in each module type
+BN_PAIRS: Dict[Type[nn.Module], List[Tuple[str, str]]] = {
+    ConvBR2d: [("conv", "norm")],
+    SeparableConvBR2d: [("conv.pointwise_conv.conv", "bn")],
+    EfficientNet: [("_conv_stem", "_bn0")],
+    MBConvBlock: [
+        ("_expand_conv", "_bn0"),
+        ("_depthwise_conv", "_bn1"),
+        ("_project_conv", "_bn2"),
+    ],
+    BasicBlock: [("conv1", "bn1"), ("conv2", "bn2")],
+    Bottleneck: [("conv1", "bn1"), ("conv2", "bn2"), ("conv3", "bn3")],
+}
+
+
+@torch.no_grad()
+def fuse_conv_bn(conv: nn.Conv2d, bn: nn.BatchNorm2d) -> None:
+    """
+    folds the running statistics and affine of bn into conv, in place.
+    conv followed by nn.Identity() then equals conv followed by bn in eval mode.
+    """
+    scale = torch.rsqrt(bn.running_var + bn.eps)  # type:ignore
+    if bn.affine:
+        scale = scale * bn.weight
+    if conv.bias is None:
+        bias = torch.zeros_like(scale)
+    else:
+        bias = conv.bias
+    conv.weight.copy_(conv.weight * scale.view(-1, 1, 1, 1))
+    bias = (bias - bn.running_mean) * scale  # type:ignore
+    if bn.affine:
+        bias = bias + bn.bias
+    conv.bias = nn.Parameter(bias)
+
+
+def _get(module: nn.Module, path: str) -> nn.Module:
+    for name in path.split("."):
+        module = getattr(module, name)
+    return module
+
+
+def _set(module: nn.Module, path: str, value: nn.Module) -> None:
+    *parents, name = path.split(".")
+    for parent in parents:
+        module = getattr(module, parent)
+    setattr(module, name, value)
+
+
+def _as_conv(module: nn.Module) -> nn.Conv2d:
+    if isinstance(module, Conv2dStaticSamePadding):
+        return module.conv
+    return module  # type:ignore
+
+
+def _fold_bn(module: nn.Module) -> None:
+    for pair_type, pairs in BN_PAIRS.items():
+        if not isinstance(module, pair_type):
+            continue
+        for conv_path, bn_path in pairs:
+            if not hasattr(module, conv_path.split(".")[0]):
+                continue
+            bn = _get(module, bn_path)
+            if isinstance(bn, nn.BatchNorm2d):
+                fuse_conv_bn(_as_conv(_get(module, conv_path)), bn)
+                _set(module, bn_path, nn.Identity())
+
+    # nn.Sequential(conv, BatchNorm2d), ex) BackboneConnector
+    if isinstance(module, nn.Sequential):
+        children = list(module.children())
+        for i in range(1, len(children)):
+            conv = _as_conv(children[i - 1])
+            bn = children[i]
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                fuse_conv_bn(conv, bn)
+                module[i] = nn.Identity()
+
+
+def _replace_swish(module: nn.Module) -> None:
+    if isinstance(module, EfficientNet):
+        module.set_swish(memory_efficient=False)
+    for name, child in module.named_children():
+        if isinstance(child, MemoryEfficientSwish):
+            setattr(module, name, Swish())
+
+
+def optimize_for_inference(model: M, fold_bn: bool = True) -> M:
+    """
+    return: an eval only copy of model with
+        (fold_bn) BatchNorm2d folded into the conv before it, for the types in BN_PAIRS
+        and (conv, bn) in nn.Sequential. a SeparableConv2d folds into its
+        pointwise conv.
+        MemoryEfficientSwish, an autograd Function for training,
+        replaced with the plain op.
+    """
+    model = copy.deepcopy(model).eval()
+    for module in list(model.modules()):
+        if fold_bn:
+            _fold_bn(module)
+        _replace_swish(module)
+    return model.requires_grad_(False)
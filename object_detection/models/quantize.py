@@ -0,0 +1,166 @@
+import torch
+from torch import nn
+from torch.utils.data import DataLoader
+from typing import List, Optional, Tuple
+from efficientnet_pytorch.utils import (
+    Conv2dStaticSamePadding as EfficientNetConv2dStaticSamePadding,
+)
+from .effidet import EfficientDet
+from .modules import (
+    Conv2dStaticSamePadding,
+    MaxPool2dStaticSamePadding,
+    fix_same_padding,
+)
+from .optimize import optimize_for_inference
+
+# quantized one by one, anchors and decoding stay float
+QUANTIZED_PARTS = ["backbone", "neck", "box_reg", "classification"]
+
+
+def _plain_conv(conv: nn.Conv2d, padding: List[int]) -> nn.Module:
+    """
+    padding: [left, right, top, bottom] before conv
+    return: nn.Conv2d padding by itself when the padding is symmetric,
+        else nn.Sequential(nn.ZeroPad2d, nn.Conv2d)
+    """
+    left, right, top, bottom = padding
+    symmetric = left == right and top == bottom
+    plain = nn.Conv2d(
+        conv.in_channels,
+        conv.out_channels,
+        conv.kernel_size,  # type:ignore
+        stride=conv.stride,  # type:ignore
+        padding=(top, left) if symmetric else 0,
+        dilation=conv.dilation,  # type:ignore
+        groups=conv.groups,
+        bias=conv.bias is not None,
+    )
+    plain.load_state_dict(conv.state_dict())
+    if symmetric:
+        return plain
+    return nn.Sequential(nn.ZeroPad2d((left, right, top, bottom)), plain)
+
+
+def freeze_same_padding(module: nn.Module, prefix: str = "") -> List[str]:
+    """
+    replaces the same padding modules of a model fixed by fix_same_padding
+    with plain nn modules, which quantize_fx traces and quantizes.
+    the padding goes into the conv where it is symmetric, as the quantized
+    depthwise kernels are fast only with the conv padding by itself.
+    return: names of depthwise convs left with asymmetric padding,
+        ex) stride 2 convs of EfficientNet
+    """
+    asymmetric: List[str] = []
+    for name, child in module.named_children():
+        path = f"{prefix}{name}"
+        plain: Optional[nn.Module] = None
+        if isinstance(child, Conv2dStaticSamePadding):
+            plain = (
+                child.conv
+                if child.folded
+                else _plain_conv(child.conv, child.static_padding)
+            )
+        elif isinstance(child, EfficientNetConv2dStaticSamePadding):
+            pad = child.static_padding
+            padding = list(pad.padding) if isinstance(pad, nn.ZeroPad2d) else [0] * 4
+            plain = _plain_conv(child, padding)
+        elif isinstance(child, MaxPool2dStaticSamePadding):
+            left, right, top, bottom = child.static_padding
+            plain = nn.Sequential(nn.ZeroPad2d((left, right, top, bottom)), child.pool)
+        if plain is None:
+            asymmetric += freeze_same_padding(child, f"{path}.")
+            continue
+        setattr(module, name, plain)
+        if isinstance(plain, nn.Sequential) and isinstance(plain[1], nn.Conv2d):
+            if plain[1].groups > 1:
+                asymmetric.append(path)
+    return asymmetric
+
+
+@torch.no_grad()
+def prepare_quantization(
+    model: EfficientDet, input_size: Tuple[int, int], backend: str = "x86"
+) -> EfficientDet:
+    """
+    return: a copy of model for input_size with observers in the backbone,
+        BiFPN and heads, to run calibrate on
+    backend: of torch.backends.quantized, ex) x86, fbgemm, qnnpack for arm
+    requires torch.ao.quantization, torch>=1.13
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx
+
+    model = optimize_for_inference(model)
+    device = next(model.parameters()).device
+    images = torch.zeros((1, 3, *input_size), device=device)
+    fix_same_padding(model, images)
+    model.precompute_anchors(input_size)
+    features = model.backbone(images)
+    head_input = model.neck(features)[model.out_ids[0]]
+    example_inputs = {
+        "backbone": images,
+        "neck": features,
+        "box_reg": head_input,
+        "classification": head_input,
+    }
+    for part in QUANTIZED_PARTS:
+        module = getattr(model, part)
+        qconfig_mapping = get_default_qconfig_mapping(backend)
+        # the int8 depthwise kernels take a slow path with padding outside the
+        # conv, which is far slower than float
+        for name in freeze_same_padding(module):
+            qconfig_mapping.set_module_name(name, None)
+        setattr(
+            model,
+            part,
+            prepare_fx(module, qconfig_mapping, (example_inputs[part],)),
+        )
+    return model
+
+
+@torch.no_grad()
+def calibrate(
+    model: EfficientDet, loader: DataLoader, num_batches: Optional[int] = None
+) -> None:
+    """
+    collects the activation ranges of a prepare_quantization model
+    loader: of PredictionSample batched with prediction_collate_fn,
+        images of the input size
+    """
+    model.eval()
+    device = next(model.parameters()).device
+    for i, (image_batch, _) in enumerate(loader):
+        if num_batches is not None and i >= num_batches:
+            break
+        model(image_batch.to(device))
+
+
+def convert_quantization(model: EfficientDet, backend: str = "x86") -> EfficientDet:
+    """
+    converts a calibrated model to int8 in place, for cpu.
+    sets torch.backends.quantized.engine to backend, which runs it.
+    """
+    from torch.ao.quantization.quantize_fx import convert_fx
+
+    torch.backends.quantized.engine = backend
+    model.cpu()
+    for part in QUANTIZED_PARTS:
+        setattr(model, part, convert_fx(getattr(model, part)))
+    return model
+
+
+def quantize_effdet(
+    model: EfficientDet,
+    loader: DataLoader,
+    input_size: Tuple[int, int],
+    backend: str = "x86",
+    num_batches: Optional[int] = None,
+) -> EfficientDet:
+    """
+    post-training static quantization of the backbone, BiFPN and heads.
+    return: an int8 copy of model for cpu, with float anchors and outputs
+        for ToBoxes as they are
+    """
+    prepared = prepare_quantization(model, input_size, backend)
+    calibrate(prepared, loader, num_batches)
+    return convert_quantization(prepared, backend)
@@ -0,0 +1,172 @@
+import torch
+import torch.nn.functional as F
+from torch import nn
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+from object_detection.entities import (
+    Image,
+    ImageBatch,
+    PascalBoxes,
+    YoloBoxes,
+    Confidences,
+    Labels,
+    yolo_to_pascal,
+    shift,
+    box_in_area,
+)
+from .utils import grouped_nms
+from .box_fusion import BoxFormat
+
+Tile = Tuple[int, int]  # x0, y0
+
+
+def tile_starts(length: int, tile_size: int, step: int) -> List[int]:
+    """
+    return: start of each tile along one axis. the last tile ends at length.
+    """
+    last = max(length - tile_size, 0)
+    starts = list(range(0, last, step))
+    return starts + [last]
+
+
+class TiledInference:
+    """
+    detection on images larger than the model input.
+    the image is cut into overlapping tiles, a few tiles go through the model
+    at once and the boxes are shifted back and merged across tiles.
+    only `batch_size` tiles are on the device at a time.
+
+    each tile owns its core, the tile without half of the overlap on the
+    sides shared with the next tiles. cores cover the image without gaps,
+    and a box not inside the core more than `min_fill` is dropped as cut
+    by the tile border. objects up to overlap / 2 are seen whole by every
+    tile keeping them.
+    """
+
+    def __init__(
+        self,
+        to_boxes: Callable,
+        tile_size: Tuple[int, int] = (512, 512),
+        overlap: int = 128,
+        batch_size: int = 8,
+        min_fill: float = 0.0,
+        iou_threshold: Optional[float] = 0.5,
+        fusion: Optional[Callable] = None,
+        device: Any = None,
+        box_format: BoxFormat = "yolo",
+    ) -> None:
+        """
+        to_boxes: decodes a batch of model outputs to
+            (List[boxes], List[Confidences], List[Labels])
+        tile_size: (width, height) of the model input
+        iou_threshold: merge tiles per class with nms. tiles are concatenated when None.
+        fusion: merge with this instead, called with one item lists
+            ex) WeightedBoxesFusion()
+        device: where tiles go through the model. the image's device when None.
+        box_format: of the boxes from to_boxes. yolo boxes of the tile, ex) CenterNet,
+            or pascal boxes in pixels of the tile, ex) EfficientDet
+        """
+        tile_w, tile_h = tile_size
+        assert 0 <= overlap < min(tile_w, tile_h)
+        self.to_boxes = to_boxes
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.min_fill = min_fill
+        self.iou_threshold = iou_threshold
+        self.fusion = fusion
+        self.device = device
+        self.box_format = box_format
+
+    def tiles(self, image_size: Tuple[int, int]) -> List[Tile]:
+        """
+        image_size: (width, height)
+        """
+        width, height = image_size
+        tile_w, tile_h = self.tile_size
+        return [
+            (x0, y0)
+            for y0 in tile_starts(height, tile_h, tile_h - self.overlap)
+            for x0 in tile_starts(width, tile_w, tile_w - self.overlap)
+        ]
+
+    def _core(self, tile: Tile, image_size: Tuple[int, int]) -> torch.Tensor:
+        x0, y0 = tile
+        width, height = image_size
+        tile_w, tile_h = self.tile_size
+        margin = self.overlap / 2
+        x1 = min(x0 + tile_w, width)
+        y1 = min(y0 + tile_h, height)
+        return torch.tensor(
+            [
+                x0 + margin if x0 > 0 else 0,
+                y0 + margin if y0 > 0 else 0,
+                x1 - margin if x1 < width else width,
+                y1 - margin if y1 < height else height,
+            ]
+        )
+
+    def _batches(self, image: Image) -> Iterator[Tuple[List[Tile], ImageBatch]]:
+        _, height, width = image.shape
+        tile_w, tile_h = self.tile_size
+        tiles = self.tiles((width, height))
+        for i in range(0, len(tiles), self.batch_size):
+            batch_tiles = tiles[i : i + self.batch_size]
+            crops = []
+            for x0, y0 in batch_tiles:
+                crop = image[:, y0 : y0 + tile_h, x0 : x0 + tile_w]
+                # images smaller than a tile are padded at the right and bottom
+                crop = F.pad(
+                    crop, (0, tile_w - crop.shape[2], 0, tile_h - crop.shape[1])
+                )
+                crops.append(crop)
+            yield batch_tiles, ImageBatch(torch.stack(crops))
+
+    def _merge(
+        self, boxes: PascalBoxes, confidences: Confidences, labels: Labels
+    ) -> Tuple[PascalBoxes, Confidences, Labels]:
+        if self.fusion is not None:
+            return self.fusion([boxes], [confidences], [labels])
+        if self.iou_threshold is None:
+            return boxes, confidences, labels
+        keep = grouped_nms(boxes, confidences, labels, self.iou_threshold)
+        return (
+            PascalBoxes(boxes[keep]),
+            Confidences(confidences[keep]),
+            Labels(labels[keep]),
+        )
+
+    @torch.no_grad()
+    def __call__(
+        self, model: nn.Module, image: Image
+    ) -> Tuple[PascalBoxes, Confidences, Labels]:
+        """
+        image: [C, H, W]
+        return: boxes in pixels of the image
+        """
+        device = self.device or image.device
+        _, height, width = image.shape
+        image_size = (width, height)
+        box_list: List[PascalBoxes] = []
+        conf_list: List[Confidences] = []
+        label_list: List[Labels] = []
+        for batch_tiles, tile_batch in self._batches(image):
+            box_batch, conf_batch, label_batch = self.to_boxes(
+                model(tile_batch.to(device))
+            )
+            for tile, boxes, confidences, labels in zip(
+                batch_tiles, box_batch, conf_batch, label_batch
+            ):
+                if self.box_format == "yolo":
+                    boxes = yolo_to_pascal(YoloBoxes(boxes), self.tile_size)
+                boxes = shift(PascalBoxes(boxes), tile)
+                keep = box_in_area(
+                    boxes, self._core(tile, image_size).to(boxes), self.min_fill
+                )
+                box_list.append(PascalBoxes(boxes[keep]))
+                conf_list.append(Confidences(confidences[keep]))
+                label_list.append(Labels(labels[keep]))
+        return self._merge(
+            PascalBoxes(torch.cat(box_list)),  # type:ignore
+            Confidences(torch.cat(conf_list)),  # type:ignore
+            Labels(torch.cat(label_list)),  # type:ignore
+        )
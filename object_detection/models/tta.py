@@ -1,14 +1,18 @@
 import torch
 from functools import partial
 from torch import nn
-from typing import Tuple, List, Callable
+from typing import Tuple, List, Callable, Dict, Optional
+from typing_extensions import Literal
 from object_detection.entities import (
     YoloBoxes,
     Confidences,
+    Labels,
     ImageBatch,
     yolo_hflip,
     yolo_vflip,
+    yolo_to_pascal,
 )
+from .utils import grouped_nms
 
 
 class HFlipTTA:
@@ -66,3 +70,102 @@ class VFlipTTA:
         box_batch, conf_batch = self.to_boxes(outputs)
         box_batch = [self.box_transform(boxes) for boxes in box_batch]
         return box_batch, conf_batch
+
+
+View = Literal["identity", "hflip", "vflip", "vhflip"]
+VIEW_DIMS: Dict[str, Tuple[int, ...]] = {
+    "identity": (),
+    "hflip": (3,),
+    "vflip": (2,),
+    "vhflip": (2, 3),
+}
+VIEW_BOX_TRANSFORMS: Dict[str, Callable[[YoloBoxes], YoloBoxes]] = {
+    "identity": lambda x: x,
+    "hflip": yolo_hflip,
+    "vflip": yolo_vflip,
+    "vhflip": lambda x: yolo_vflip(yolo_hflip(x)),
+}
+
+
+class MultiViewTTA:
+    def __init__(
+        self,
+        to_boxes: Callable,
+        views: List[View] = ["identity", "hflip", "vflip", "vhflip"],
+        chunk_size: Optional[int] = None,
+        iou_threshold: Optional[float] = None,
+        fusion: Optional[Callable] = None,
+    ) -> None:
+        """
+        to_boxes: decodes a batch of model outputs to
+            (List[YoloBoxes], List[Confidences], List[Labels])
+        chunk_size: max images per forward. all views go in one forward when None.
+        iou_threshold: merge views per class with nms. views are concatenated when None.
+        fusion: merge the per view lists of an image instead,
+            ex) WeightedBoxesFusion(box_format="yolo")
+        """
+        self.to_boxes = to_boxes
+        self.views = views
+        self.chunk_size = chunk_size
+        self.iou_threshold = iou_threshold
+        self.fusion = fusion
+
+    def _merge(
+        self, boxes: YoloBoxes, confidences: Confidences, labels: Labels
+    ) -> Tuple[YoloBoxes, Confidences, Labels]:
+        if self.iou_threshold is None:
+            return boxes, confidences, labels
+        keep = grouped_nms(
+            yolo_to_pascal(boxes, (1, 1)), confidences, labels, self.iou_threshold
+        )
+        return (
+            YoloBoxes(boxes[keep]),
+            Confidences(confidences[keep]),
+            Labels(labels[keep]),
+        )
+
+    @torch.no_grad()
+    def __call__(
+        self, model: nn.Module, images: ImageBatch
+    ) -> Tuple[List[YoloBoxes], List[Confidences], List[Labels]]:
+        batch_size = len(images)
+        view_images = torch.cat(
+            [
+                torch.flip(images, dims=VIEW_DIMS[v]) if VIEW_DIMS[v] else images
+                for v in self.views
+            ]
+        )
+        view_box_batch: List[YoloBoxes] = []
+        view_conf_batch: List[Confidences] = []
+        view_label_batch: List[Labels] = []
+        for chunk in view_images.split(self.chunk_size or len(view_images)):
+            box_batch, conf_batch, label_batch = self.to_boxes(model(ImageBatch(chunk)))
+            view_box_batch += box_batch
+            view_conf_batch += conf_batch
+            view_label_batch += label_batch
+
+        box_batch = []
+        conf_batch = []
+        label_batch = []
+        for i in range(batch_size):
+            ids = [v * batch_size + i for v in range(len(self.views))]
+            box_list = [
+                VIEW_BOX_TRANSFORMS[v](view_box_batch[j])
+                for v, j in zip(self.views, ids)
+            ]
+            conf_list = [view_conf_batch[j] for j in ids]
+            label_list = [view_label_batch[j] for j in ids]
+            if self.fusion is not None:
+                boxes, confidences, labels = self.fusion(
+                    box_list, conf_list, label_list
+                )
+            else:
+                boxes, confidences, labels = self._merge(
+                    YoloBoxes(torch.cat(box_list)),  # type:ignore
+                    Confidences(torch.cat(conf_list)),  # type:ignore
+                    Labels(torch.cat(label_list)),  # type:ignore
+                )
+            box_batch.append(boxes)
+            conf_batch.append(confidences)
+            label_batch.append(labels)
+        return box_batch, conf_batch, label_batch
@@ -3,6 +3,7 @@ import numpy as np
 import typing as t
 from functools import partial
 from torch import nn, Tensor
+from torchvision.ops import nms
 from torchvision.ops.boxes import box_area
 
 
@@ -47,8 +48,6 @@ def bias_init_with_prob(prior_prob: t.Any) -> t.Any:
 
 
 def box_cxcywh_to_xyxy(x: Tensor) -> Tensor:
-    if x.shape[0] == 0:
-        return x
     x_c, y_c, w, h = x.unbind(-1)
     out = [
         (x_c - 0.5 * w),
@@ -118,3 +117,78 @@ class NestedTensor:
 
     def __repr__(self) -> str:
         return str(self.tensors)
+
+
+def rank_by_group(scores: Tensor, groups: Tensor) -> Tensor:
+    """
+    rank of each score inside its group. 0 is the highest score of the group.
+    """
+    count = scores.shape[0]
+    positions = torch.arange(count, device=scores.device)
+    score_ranks = torch.empty_like(positions)
+    score_ranks[scores.argsort(descending=True)] = positions
+    order = (groups.long() * count + score_ranks).argsort()
+    sorted_groups = groups[order]
+    is_head = torch.ones_like(sorted_groups, dtype=torch.bool)
+    is_head[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    # first position of each group, spread over the group. cumsum exports to onnx
+    heads = positions[is_head][is_head.long().cumsum(dim=0) - 1]
+    ranks = torch.empty_like(positions)
+    ranks[order] = positions - heads
+    return ranks
+
+
+def grouped_nms(
+    boxes: Tensor, scores: Tensor, groups: Tensor, iou_threshold: float
+) -> Tensor:
+    """
+    class-aware nms in a single call. boxes of each group are shifted apart
+    so that boxes in different groups never overlap.
+    no branch on the box count, which tracing would fix to that of the example.
+    """
+    # the max of no boxes is 0
+    offsets = groups.to(boxes) * (
+        torch.cat([boxes.flatten(), boxes.new_zeros(1)]).max() + 1
+    )
+    return nms(boxes + offsets[:, None], scores, iou_threshold)
+
+
+def split_by_batch(
+    batch_ids: Tensor, batch_size: int, *values: Tensor
+) -> t.List[t.List[Tensor]]:
+    """
+    split flattened values into per-image lists, keeping their order in each image
+    """
+    count = len(batch_ids)
+    sort_indices = (
+        batch_ids * count + torch.arange(count, device=batch_ids.device)
+    ).argsort()
+    counts = torch.bincount(batch_ids, minlength=batch_size).tolist()
+    return [list(x[sort_indices].split(counts)) for x in values]
+
+
+def pad_by_batch(
+    batch_ids: Tensor,
+    batch_size: int,
+    limit: int,
+    boxes: Tensor,
+    scores: Tensor,
+    labels: Tensor,
+) -> t.Tuple[Tensor, Tensor, Tensor]:
+    """
+    flattened boxes into [batch_size, limit] tensors, highest scores first.
+    the rest is zero boxes and scores, and -1 labels.
+    """
+    slots = rank_by_group(scores, batch_ids)
+    keep = slots < limit
+    batch_ids = batch_ids[keep]
+    slots = slots[keep]
+    padded_boxes = boxes.new_zeros((batch_size, limit, 4))
+    padded_scores = scores.new_zeros((batch_size, limit))
+    padded_labels = torch.full(
+        (batch_size, limit), -1, dtype=labels.dtype, device=labels.device
+    )
+    padded_boxes[batch_ids, slots] = boxes[keep]
+    padded_scores[batch_ids, slots] = scores[keep]
+    padded_labels[batch_ids, slots] = labels[keep]
+    return padded_boxes, padded_scores, padded_labels
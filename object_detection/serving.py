@@ -0,0 +1,323 @@
+import asyncio
+import json
+import time
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from torch import nn, Tensor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from object_detection.entities import (
+    ImageId,
+    Image,
+    ImageBatch,
+    PredictionSample,
+    Confidences,
+    Labels,
+)
+from object_detection.meters import MeanMeter, PercentileMeter
+
+Prediction = Tuple[ImageId, Tensor, Confidences, Labels]  # boxes as to_boxes gives
+Request = Tuple[PredictionSample, "asyncio.Future[Prediction]", float]
+
+
+class BatchPredictor:
+    """
+    dynamic batching in front of model + to_boxes.
+    requests wait in a queue until max_batch_size of them are there or
+    the first one has waited max_wait seconds, then they share one forward.
+    the forward runs in a worker thread so the loop keeps taking requests,
+    which are batched while the previous forward runs.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        to_boxes: Callable,
+        max_batch_size: int = 8,
+        max_wait: float = 0.005,
+        device: Any = "cpu",
+    ) -> None:
+        """
+        to_boxes: decodes a batch of model outputs to
+            (List[boxes], List[Confidences], List[Labels]), ex) effidet.ToBoxes
+        """
+        self.model = model.eval()
+        self.to_boxes = to_boxes
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.device = device
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue: Optional["asyncio.Queue[Request]"] = None
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        self.latency_meter = PercentileMeter()
+        self.batch_size_meter = MeanMeter()
+        self.started_at = time.perf_counter()
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        latency_*: seconds from a request in to its result out, 0 before the first
+        throughput: requests per second since reset_metrics
+        """
+        elapsed = time.perf_counter() - self.started_at
+        count = self.latency_meter.count
+        return {
+            "count": float(count),
+            "throughput": count / elapsed if elapsed > 0 else 0.0,
+            "batch_size": self.batch_size_meter.get_value(),
+            "latency_p50": self.latency_meter.get_value(50),
+            "latency_p95": self.latency_meter.get_value(95),
+            "latency_p99": self.latency_meter.get_value(99),
+        }
+
+    async def __call__(self, sample: PredictionSample) -> Prediction:
+        if self.queue is None:
+            raise RuntimeError("BatchPredictor.run is not running")
+        future: "asyncio.Future[Prediction]" = asyncio.get_event_loop().create_future()
+        await self.queue.put((sample, future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self, queue: "asyncio.Queue[Request]") -> List[Request]:
+        batch = [await queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @torch.no_grad()
+    def _predict(self, images: List[Image]) -> List[Tuple[Any, Any, Any]]:
+        # one forward per image size
+        results: List[Tuple[Any, Any, Any]] = [None] * len(images)  # type:ignore
+        shapes: Dict[Tuple[int, ...], List[int]] = {}
+        for i, image in enumerate(images):
+            shapes.setdefault(tuple(image.shape), []).append(i)
+        for ids in shapes.values():
+            batch = ImageBatch(torch.stack([images[i] for i in ids]).to(self.device))
+            box_batch, conf_batch, label_batch = self.to_boxes(self.model(batch))
+            for i, boxes, confidences, labels in zip(
+                ids, box_batch, conf_batch, label_batch
+            ):
+                results[i] = (boxes.cpu(), confidences.cpu(), labels.cpu())
+        return results
+
+    async def run(self) -> None:
+        """
+        serve requests until cancelled
+        """
+        loop = asyncio.get_event_loop()
+        queue: "asyncio.Queue[Request]" = asyncio.Queue()
+        self.queue = queue
+        try:
+            while True:
+                batch = await self._next_batch(queue)
+                images = [sample[1] for sample, _, _ in batch]
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor, self._predict, images
+                    )
+                except Exception as e:
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batch_size_meter.update(len(batch))
+                now = time.perf_counter()
+                for (sample, future, queued_at), result in zip(batch, results):
+                    self.latency_meter.update(now - queued_at)
+                    if not future.done():
+                        future.set_result((sample[0], *result))
+        finally:
+            self.queue = None
+
+
+def encode_image(image: Image) -> Tuple[Dict[str, str], bytes]:
+    array = image.cpu().numpy()
+    headers = {
+        "X-Image-Shape": ",".join(str(x) for x in array.shape),
+        "X-Image-Dtype": str(array.dtype),
+    }
+    return headers, array.tobytes()
+
+
+def decode_image(headers: Dict[str, str], body: bytes) -> Image:
+    shape = [int(x) for x in headers["x-image-shape"].split(",")]
+    array = np.frombuffer(body, dtype=headers["x-image-dtype"]).reshape(shape)
+    return Image(torch.from_numpy(array.copy()))
+
+
+async def _read_http(
+    reader: asyncio.StreamReader,
+) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+    """
+    return: (start line, headers with lowercase keys, body), None at eof
+    """
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, value = line.decode().split(":", 1)
+        headers[key.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return start_line.decode().strip(), headers, body
+
+
+def _http_response(status: str, payload: Dict[str, Any]) -> bytes:
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+class InferenceServer:
+    """
+    minimal HTTP/1.1 front of a BatchPredictor, keep-alive connections.
+    POST /predict
+        body: raw image bytes [C, H, W]
+        headers: X-Image-Id, X-Image-Shape ex) 3,512,512, X-Image-Dtype ex) float32
+        response: {"id", "boxes", "confidences", "labels"}
+    GET /metrics
+        response: BatchPredictor.metrics()
+    """
+
+    def __init__(
+        self, predictor: BatchPredictor, host: str = "127.0.0.1", port: int = 8765
+    ) -> None:
+        self.predictor = predictor
+        self.host = host
+        self.port = port
+
+    async def _predict(self, headers: Dict[str, str], body: bytes) -> bytes:
+        image_id = ImageId(headers.get("x-image-id", ""))
+        try:
+            sample = (image_id, decode_image(headers, body))
+            _, boxes, confidences, labels = await self.predictor(sample)
+        except Exception as e:
+            return _http_response("500 Internal Server Error", {"error": repr(e)})
+        return _http_response(
+            "200 OK",
+            {
+                "id": image_id,
+                "boxes": boxes.tolist(),
+                "confidences": confidences.tolist(),
+                "labels": labels.tolist(),
+            },
+        )
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request = await _read_http(reader)
+                if request is None:
+                    break
+                start_line, headers, body = request
+                method, path, _ = start_line.split(" ", 2)
+                if method == "GET" and path == "/metrics":
+                    response = _http_response("200 OK", self.predictor.metrics())
+                elif method == "POST" and path == "/predict":
+                    response = await self._predict(headers, body)
+                else:
+                    response = _http_response("404 Not Found", {"path": path})
+                writer.write(response)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> asyncio.AbstractServer:
+        """
+        starts the predictor and listens. port 0 picks a free port.
+        """
+        self.predictor_task = asyncio.ensure_future(self.predictor.run())
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # type:ignore
+        return self.server
+
+    async def close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+        self.predictor_task.cancel()
+        try:
+            await self.predictor_task
+        except asyncio.CancelledError:
+            pass
+
+    async def serve_forever(self) -> None:
+        server = await self.start()
+        try:
+            await server.serve_forever()
+        finally:
+            await self.close()
+
+
+class InferenceClient:
+    """
+    keep-alive client of InferenceServer
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        self.host = host
+        self.port = port
+        self.connection: Optional[
+            Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+        ] = None
+
+    async def _request(
+        self, method: str, path: str, headers: Dict[str, str], body: bytes = b""
+    ) -> Dict[str, Any]:
+        if self.connection is None:
+            self.connection = await asyncio.open_connection(self.host, self.port)
+        reader, writer = self.connection
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+        for key, value in {**headers, "Content-Length": str(len(body))}.items():
+            head += f"{key}: {value}\r\n"
+        writer.write(head.encode() + b"\r\n" + body)
+        await writer.drain()
+        response = await _read_http(reader)
+        if response is None:
+            raise ConnectionError("connection closed")
+        status_line, _, payload = response
+        if not status_line.startswith("HTTP/1.1 200"):
+            raise RuntimeError(status_line)
+        return json.loads(payload)
+
+    async def predict(self, sample: PredictionSample) -> Prediction:
+        image_id, image = sample
+        headers, body = encode_image(image)
+        res = await self._request(
+            "POST", "/predict", {**headers, "X-Image-Id": image_id}, body
+        )
+        return (
+            ImageId(res["id"]),
+            torch.tensor(res["boxes"]).view(-1, 4),
+            Confidences(torch.tensor(res["confidences"])),
+            Labels(torch.tensor(res["labels"], dtype=torch.long)),
+        )
+
+    async def metrics(self) -> Dict[str, float]:
+        return await self._request("GET", "/metrics", {})
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            _, writer = self.connection
+            writer.close()
+            self.connection = None
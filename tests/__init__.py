@@ -0,0 +1,13 @@
+import torch
+from object_detection.entities import PascalBoxes
+
+
+def random_boxes(
+    count: int, size: float = 200.0, min_wh: float = 10.0, max_wh: float = 40.0
+) -> PascalBoxes:
+    """
+    x0, y0 in [0, size), width and height in [min_wh, max_wh)
+    """
+    x0y0 = torch.rand(count, 2) * size
+    wh = min_wh + torch.rand(count, 2) * (max_wh - min_wh)
+    return PascalBoxes(torch.cat([x0y0, x0y0 + wh], dim=1))
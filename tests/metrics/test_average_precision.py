@@ -1,7 +1,16 @@
 import numpy as np
 import torch
+import pytest
+import typing as t
+from torchvision.ops.boxes import box_iou
 from object_detection.entities import Labels, PascalBoxes, Confidences
-from object_detection.metrics.average_precision import AveragePrecision, auc
+from object_detection.metrics.average_precision import (
+    AveragePrecision,
+    GrowableArray,
+    auc,
+    match_greedy,
+)
+from tests import random_boxes
 
 
 def test_average_precision() -> None:
@@ -95,3 +104,107 @@ def test_has_gt_no_box() -> None:
 
     res = metrics()
     assert round(res, 4) == round(0, 4)
+
+
+def test_match_greedy() -> None:
+    iou_matrix = box_iou(random_boxes(500), random_boxes(100))
+    ious, matched_gt_ids = torch.max(iou_matrix, dim=1)
+    expected = np.zeros(len(iou_matrix))
+    matched: t.Set[int] = set()
+    for box_id, gt_id in enumerate(matched_gt_ids.tolist()):
+        if ious[box_id] > 0.3 and gt_id not in matched:
+            expected[box_id] = 1
+            matched.add(gt_id)
+    res = match_greedy(iou_matrix, 0.3)
+    assert expected.sum() > 0
+    assert (res == expected).all()
+
+
+def test_growable_array() -> None:
+    array = GrowableArray(capacity=2)
+    array.extend(np.arange(3))
+    array.extend(np.arange(2))
+    assert array.view().tolist() == [0, 1, 2, 0, 1]
+    array.clear()
+    assert len(array) == 0
+
+
+def test_use_growable_array() -> None:
+    metrics = AveragePrecision(iou_threshold=0.3)
+    growable = AveragePrecision(iou_threshold=0.3, use_growable_array=True)
+    for count in [0, 30, 100]:
+        boxes = random_boxes(count)
+        confidences = Confidences(torch.rand(count))
+        gt_boxes = random_boxes(20)
+        metrics.add(boxes, confidences, gt_boxes)
+        growable.add(boxes, confidences, gt_boxes)
+    assert metrics() == growable()
+
+
+@pytest.mark.parametrize("use_growable_array", [False, True])
+def test_average_precision_bench(benchmark: t.Any, use_growable_array: bool) -> None:
+    samples = [
+        (random_boxes(1000), Confidences(torch.rand(1000)), random_boxes(100))
+        for _ in range(10)
+    ]
+    metrics = AveragePrecision(iou_threshold=0.3, use_growable_array=use_growable_array)
+
+    def run() -> float:
+        metrics.reset()
+        for boxes, confidences, gt_boxes in samples:
+            metrics.add(boxes, confidences, gt_boxes)
+        return metrics()
+
+    benchmark(run)
+
+
+@pytest.mark.parametrize("use_growable_array", [False, True])
+def test_merge(use_growable_array: bool) -> None:
+    samples = [
+        (random_boxes(count), Confidences(torch.rand(count)), random_boxes(20))
+        for count in [0, 30, 100, 50]
+    ]
+    expected = AveragePrecision(iou_threshold=0.3)
+    shards = [
+        AveragePrecision(iou_threshold=0.3, use_growable_array=use_growable_array)
+        for _ in range(2)
+    ]
+    for i, sample in enumerate(samples):
+        expected.add(*sample)
+        shards[i % 2].add(*sample)
+    shards[0].merge(shards[1])
+    assert shards[0]() == expected()
+
+    restored = AveragePrecision(iou_threshold=0.3)
+    restored.load_state_dict(expected.state_dict())
+    assert restored() == expected()
+    assert restored.state_dict()["tp"].dtype == bool
+
+
+@pytest.mark.parametrize("bins", [10, 100, 1000])
+def test_histogram(bins: int) -> None:
+    exact = AveragePrecision(iou_threshold=0.3)
+    histogram = AveragePrecision(iou_threshold=0.3, bins=bins)
+    for _ in range(10):
+        gt_boxes = random_boxes(30)
+        boxes = PascalBoxes(
+            torch.cat([gt_boxes + torch.randn(30, 4) * 3, random_boxes(50)])
+        )
+        confidences = Confidences(torch.rand(80))
+        exact.add(boxes, confidences, gt_boxes)
+        histogram.add(boxes, confidences, gt_boxes)
+    lower, upper = histogram.bounds()
+    eps = 1e-12
+    assert lower - eps <= exact() <= upper + eps
+    assert lower - eps <= histogram() <= upper + eps
+    assert histogram.state_dict()["tp_hist"].shape == (bins,)
+
+    merged = AveragePrecision(iou_threshold=0.3, bins=bins)
+    merged.merge(histogram)
+    assert merged() == histogram()
+
+
+def test_histogram_empty() -> None:
+    metrics = AveragePrecision(iou_threshold=0.3, bins=10)
+    assert metrics() == 1.0
+    assert metrics.bounds() == (1.0, 1.0)
@@ -0,0 +1,101 @@
+import numpy as np
+import torch
+import typing as t
+from torchvision.ops.boxes import box_iou
+from object_detection.entities import Labels, PascalBoxes, Confidences
+from object_detection.metrics import CocoMeanAveragePrecision, MeanAveragePrecision
+from object_detection.metrics.average_precision import match_greedy
+from object_detection.metrics.coco_mean_average_precision import (
+    match_greedy_thresholds,
+)
+from tests import random_boxes
+
+
+def _random_samples(
+    count: int, num_classes: int
+) -> t.List[t.Tuple[PascalBoxes, Confidences, Labels, PascalBoxes, Labels]]:
+    samples = []
+    for _ in range(count):
+        gt_boxes = random_boxes(30)
+        gt_labels = Labels(torch.randint(0, num_classes, (30,)))
+        boxes = PascalBoxes(
+            torch.cat([gt_boxes + torch.randn(30, 4) * 6, random_boxes(70)])
+        )
+        labels = Labels(torch.cat([gt_labels, torch.randint(0, num_classes, (70,))]))
+        samples.append(
+            (boxes, Confidences(torch.rand(100)), labels, gt_boxes, gt_labels)
+        )
+    return samples
+
+
+def test_match_greedy_thresholds() -> None:
+    iou_matrix = box_iou(random_boxes(300), random_boxes(50))
+    ious, matched_gt_ids = iou_matrix.max(dim=1)
+    thresholds = np.array([0.1, 0.3, 0.5, 0.7])
+    res = match_greedy_thresholds(ious.numpy(), matched_gt_ids.numpy(), thresholds)
+    for tp, threshold in zip(res, thresholds):
+        assert (tp == match_greedy(iou_matrix, threshold)).all()
+
+
+def test_coco_map() -> None:
+    samples = _random_samples(10, num_classes=3)
+    metrics = CocoMeanAveragePrecision(num_classes=3)
+    for sample in samples:
+        metrics.add(*sample)
+    res = metrics()
+    for threshold in [0.5, 0.75, 0.9]:
+        expected = MeanAveragePrecision(num_classes=3, iou_threshold=threshold)
+        for sample in samples:
+            expected.add(*sample)
+        assert round(res[f"map_{int(threshold * 100)}"], 8) == round(expected()[0], 8)
+    expected_map = np.mean(
+        [res[f"map_{int(round(x * 100))}"] for x in metrics.iou_thresholds]
+    )
+    assert round(res["map"], 8) == round(expected_map, 8)
+
+
+def test_coco_map_area() -> None:
+    metrics = CocoMeanAveragePrecision(num_classes=1, iou_thresholds=[0.5])
+    gt_boxes = PascalBoxes(torch.tensor([[0.0, 0.0, 10.0, 10.0], [0, 0, 100, 100]]))
+    gt_labels = Labels(torch.tensor([0, 0]))
+    boxes = PascalBoxes(
+        torch.tensor([[0.0, 0.0, 10.0, 10.0], [200, 200, 300, 300], [0, 0, 100, 100]])
+    )
+    confidences = Confidences(torch.tensor([0.9, 0.8, 0.7]))
+    labels = Labels(torch.tensor([0, 0, 0]))
+    metrics.add(boxes, confidences, labels, gt_boxes, gt_labels)
+    res = metrics()
+    assert round(res["map_small"], 4) == 1.0
+    assert res["map_medium"] == -1.0
+    # the large false positive ranks before the large tp
+    assert round(res["map_large"], 4) == 0.5
+    assert round(res["map"], 4) == round(1 / 2 + 1 / 2 * 2 / 3, 4)
+
+
+def test_coco_map_bench(benchmark: t.Any) -> None:
+    samples = _random_samples(20, num_classes=5)
+    metrics = CocoMeanAveragePrecision(num_classes=5)
+
+    def run() -> t.Dict[str, float]:
+        metrics.reset()
+        for sample in samples:
+            metrics.add(*sample)
+        return metrics()
+
+    benchmark(run)
+
+
+def test_coco_map_merge() -> None:
+    samples = _random_samples(6, num_classes=3)
+    expected = CocoMeanAveragePrecision(num_classes=3)
+    shards = [CocoMeanAveragePrecision(num_classes=3) for _ in range(3)]
+    for i, sample in enumerate(samples):
+        expected.add(*sample)
+        shards[i % 3].add(*sample)
+    shards[0].merge(shards[1])
+    shards[0].merge(shards[2])
+    assert shards[0]() == expected()
+
+    restored = CocoMeanAveragePrecision(num_classes=3)
+    restored.load_state_dict(expected.state_dict())
+    assert restored() == expected()
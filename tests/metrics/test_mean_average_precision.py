@@ -1,7 +1,10 @@
+import pytest
+import typing as t
 import numpy as np
 import torch
 from object_detection.entities import Labels, PascalBoxes, Confidences
 from object_detection.metrics.mean_average_precision import MeanAveragePrecision
+from tests import random_boxes
 
 
 def test_half() -> None:
@@ -57,3 +60,103 @@ def test_half() -> None:
     score, scores = metrics()
     print(score)
     print(scores)
+
+
+def test_merge() -> None:
+    gt_boxes = PascalBoxes(torch.tensor([[0, 0, 10, 10], [20, 20, 30, 30]]))
+    gt_labels = Labels(torch.tensor([0, 1]))
+    samples = [
+        (
+            PascalBoxes(torch.tensor([[0, 0, 11, 11], [19, 19, 30, 30]])),
+            Confidences(torch.tensor([0.9, 0.8])),
+            Labels(torch.tensor([0, 0])),
+            gt_boxes,
+            gt_labels,
+        ),
+        (
+            PascalBoxes(torch.tensor([[19, 19, 30, 30], [0, 0, 11, 11]])),
+            Confidences(torch.tensor([0.7, 0.6])),
+            Labels(torch.tensor([1, 0])),
+            gt_boxes,
+            gt_labels,
+        ),
+    ]
+    expected = MeanAveragePrecision(num_classes=3, iou_threshold=0.3)
+    shards = [MeanAveragePrecision(num_classes=3, iou_threshold=0.3) for _ in samples]
+    for shard, sample in zip(shards, samples):
+        expected.add(*sample)
+        shard.add(*sample)
+    shards[0].merge(shards[1])
+    assert shards[0]() == expected()
+
+    restored = MeanAveragePrecision(num_classes=3, iou_threshold=0.3)
+    restored.load_state_dict(expected.state_dict())
+    assert restored() == expected()
+
+
+def _random_batch(
+    counts: t.List[t.Tuple[int, int]], num_classes: int
+) -> t.Tuple[
+    t.List[PascalBoxes],
+    t.List[Confidences],
+    t.List[Labels],
+    t.List[PascalBoxes],
+    t.List[Labels],
+]:
+    return (
+        [random_boxes(n_box) for n_box, _ in counts],
+        [Confidences(torch.rand(n_box)) for n_box, _ in counts],
+        [Labels(torch.randint(0, num_classes, (n_box,))) for n_box, _ in counts],
+        [random_boxes(n_gt_box) for _, n_gt_box in counts],
+        [Labels(torch.randint(0, num_classes, (n_gt_box,))) for _, n_gt_box in counts],
+    )
+
+
+def test_add_batch() -> None:
+    batch = _random_batch([(100, 20), (0, 5), (30, 0), (0, 0), (200, 40)], 4)
+    expected = MeanAveragePrecision(num_classes=4, iou_threshold=0.3)
+    for sample in zip(*batch):
+        expected.add(*sample)
+    metrics = MeanAveragePrecision(num_classes=4, iou_threshold=0.3)
+    metrics.add_batch(*batch)
+    score, scores = metrics()
+    expected_score, expected_scores = expected()
+    assert round(score, 8) == round(expected_score, 8)
+    for k, v in scores.items():
+        assert round(v, 8) == round(expected_scores[k], 8)
+
+
+def test_add_batch_empty() -> None:
+    metrics = MeanAveragePrecision(num_classes=2, iou_threshold=0.3)
+    metrics.add_batch([], [], [], [], [])
+    assert metrics.state_dict()["n_gt_box"].tolist() == [0, 0]
+
+
+@pytest.mark.parametrize("use_batch", [False, True])
+def test_add_batch_bench(benchmark: t.Any, use_batch: bool) -> None:
+    batch = _random_batch([(300, 30)] * 16, 20)
+    metrics = MeanAveragePrecision(num_classes=20, iou_threshold=0.3)
+
+    def run() -> None:
+        metrics.reset()
+        if use_batch:
+            metrics.add_batch(*batch)
+        else:
+            for sample in zip(*batch):
+                metrics.add(*sample)
+
+    benchmark(run)
+
+
+def test_histogram() -> None:
+    batch = _random_batch([(100, 20), (0, 5), (30, 0), (200, 40)], 4)
+    exact = MeanAveragePrecision(num_classes=4, iou_threshold=0.3)
+    histogram = MeanAveragePrecision(num_classes=4, iou_threshold=0.3, bins=1000)
+    exact.add_batch(*batch)
+    histogram.add_batch(*batch)
+    lower, upper = histogram.bounds()
+    assert lower - 1e-12 <= exact()[0] <= upper + 1e-12
+
+    restored = MeanAveragePrecision(num_classes=4, iou_threshold=0.3, bins=1000)
+    restored.load_state_dict(histogram.state_dict())
+    assert restored() == histogram()
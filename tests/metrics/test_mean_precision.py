@@ -1,3 +1,5 @@
+import pytest
+import typing as t
 import torch
 import numpy as np
 from object_detection.entities import (
@@ -5,8 +7,10 @@ from object_detection.entities import (
     YoloBoxes,
     coco_to_pascal,
     Confidences,
+    PascalBoxes,
 )
 from object_detection.metrics import MeanPrecition
+from tests import random_boxes
 
 gts = np.array(
     [
@@ -104,3 +108,33 @@ def test_mean_precision() -> None:
     fn = MeanPrecition()
     res = fn(pred_boxes, gt_boxes)
     assert res < 0.37
+
+
+def test_mean_precision_batch() -> None:
+    pred_boxes = coco_to_pascal(CoCoBoxes(torch.from_numpy(preds)))
+    gt_boxes = coco_to_pascal(CoCoBoxes(torch.from_numpy(gts)))
+    pred_batch = [pred_boxes, random_boxes(30), random_boxes(3), random_boxes(0)]
+    gt_batch = [gt_boxes, random_boxes(20), random_boxes(0), random_boxes(0)]
+    pred_batch[1] = PascalBoxes(torch.cat([pred_batch[1], gt_batch[1][:10] + 2]))
+    fn = MeanPrecition()
+    score, scores = fn.batch(pred_batch, gt_batch)
+    expected = [fn(p, g) for p, g in zip(pred_batch, gt_batch)]
+    assert len(scores) == 4
+    for res, ex in zip(scores, expected):
+        assert abs(res - ex) < 1e-6
+    assert abs(score - np.mean(expected)) < 1e-6
+
+
+def test_mean_precision_batch_empty() -> None:
+    assert MeanPrecition().batch([], []) == (0.0, [])
+
+
+@pytest.mark.parametrize("use_batch", [False, True])
+def test_mean_precision_bench(benchmark: t.Any, use_batch: bool) -> None:
+    pred_batch = [random_boxes(100) for _ in range(32)]
+    gt_batch = [random_boxes(80) for _ in range(32)]
+    fn = MeanPrecition()
+    if use_batch:
+        benchmark(lambda: fn.batch(pred_batch, gt_batch))
+    else:
+        benchmark(lambda: [fn(p, g) for p, g in zip(pred_batch, gt_batch)])
@@ -57,3 +57,14 @@ def test_anchors(
     plot.save(
         f"store/test-anchors-{size}-{stride}-{'-'.join([str(x) for x in  scales])}-{num_anchors}.png"
     )
+
+
+def test_anchors_cache() -> None:
+    images = ImageBatch(torch.zeros((1, 3, 4, 4)))
+    fn = Anchors(cache_size=2)
+    res = fn(images, 8)
+    assert fn(images, 8) is res
+    assert not torch.equal(fn(images, 16), res)
+    fn(ImageBatch(torch.zeros((1, 3, 5, 5))), 8)
+    assert len(fn.cache) == 2
+    assert torch.equal(Anchors(use_cache=False)(images, 8), res)
@@ -2,6 +2,7 @@ import typing
 import torch
 from object_detection.entities import PascalBoxes
 from object_detection.models.atss import ATSS
+from tests import random_boxes
 
 
 def test_atss_bench(benchmark: typing.Any) -> None:
@@ -27,3 +28,69 @@ def test_atss_bench(benchmark: typing.Any) -> None:
     fn = ATSS(topk=3)
     res = benchmark(lambda: fn(anchor, gt))
     assert res.tolist() == [[0, 0], [1, 1]]
+
+
+def test_atss_conflict() -> None:
+    anchor = PascalBoxes(
+        torch.tensor(
+            [
+                [0, 0, 10, 10],
+                [10, 10, 20, 20],
+                [40, 40, 50, 50],
+            ]
+        ).float()
+    )
+    gt = PascalBoxes(
+        torch.tensor(
+            [
+                [0, 0, 12, 12],
+                [1, 1, 10, 10],
+            ]
+        ).float()
+    )
+    fn = ATSS(topk=3)
+    res = fn(anchor, gt)
+    assert res.tolist() == [[1, 0]]
+
+
+def test_atss_large_bench(benchmark: typing.Any) -> None:
+    anchor_count = 50000
+    gt_count = 300
+    anchor = random_boxes(anchor_count, size=1000, min_wh=16, max_wh=80)
+    gt = random_boxes(gt_count, size=1000, min_wh=16, max_wh=80)
+    fn = ATSS(topk=9)
+    res = benchmark(lambda: fn(anchor, gt))
+    assert res.shape[1] == 2
+    assert len(res[:, 1].unique()) == len(res)
+
+
+def test_atss_levels() -> None:
+    anchor_levels = [
+        PascalBoxes(
+            torch.tensor(
+                [
+                    [11, 11, 21, 21],
+                    [21, 22, 32, 32],
+                ]
+            ).float()
+        ),
+        PascalBoxes(
+            torch.tensor(
+                [
+                    [25, 25, 35, 35],
+                    [35, 35, 45, 45],
+                ]
+            ).float()
+        ),
+    ]
+    gt = PascalBoxes(
+        torch.tensor(
+            [
+                [10, 10, 20, 20],
+                [20, 20, 30, 30],
+            ]
+        ).float()
+    )
+    fn = ATSS(topk=2)
+    res = fn(anchor_levels, gt)
+    assert res.tolist() == [[0, 0], [1, 1]]
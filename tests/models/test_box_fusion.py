@@ -0,0 +1,99 @@
+import math
+import torch
+import typing as t
+from torchvision.ops.boxes import box_iou
+from torch import Tensor
+from object_detection.entities import (
+    PascalBoxes,
+    YoloBoxes,
+    Confidences,
+    Labels,
+    pascal_to_yolo,
+    yolo_to_pascal,
+)
+from object_detection.models.box_fusion import WeightedBoxesFusion, SoftNMS
+from tests import random_boxes
+
+
+def test_wbf() -> None:
+    box_list = [
+        PascalBoxes(torch.tensor([[0.0, 0.0, 10.0, 10.0], [50, 50, 60, 60]])),
+        PascalBoxes(torch.tensor([[1.0, 1.0, 11.0, 11.0], [100, 100, 110, 110]])),
+    ]
+    confidence_list = [
+        Confidences(torch.tensor([0.9, 0.8])),
+        Confidences(torch.tensor([0.7, 0.6])),
+    ]
+    label_list = [Labels(torch.tensor([0, 1])), Labels(torch.tensor([0, 1]))]
+    boxes, confidences, labels = WeightedBoxesFusion()(
+        box_list, confidence_list, label_list
+    )
+    assert torch.allclose(
+        boxes[0], torch.tensor([0.7 / 1.6] * 2 + [10 + 0.7 / 1.6] * 2)
+    )
+    assert torch.allclose(confidences, torch.tensor([0.8, 0.4, 0.3]))
+    assert labels.tolist() == [0, 1, 1]
+
+    # another class is never fused
+    label_list = [Labels(torch.tensor([0, 1])), Labels(torch.tensor([1, 1]))]
+    boxes, _, _ = WeightedBoxesFusion()(box_list, confidence_list, label_list)
+    assert len(boxes) == 4
+
+    # weights scale each source
+    _, confidences, _ = WeightedBoxesFusion(weights=[1.0, 3.0])(
+        box_list, confidence_list, [label_list[0], label_list[0]]
+    )
+    assert math.isclose(float(confidences[0]), (0.9 + 2.1) / 2 * 2 / 4, rel_tol=1e-6)
+
+
+def test_wbf_yolo() -> None:
+    box_list = [
+        PascalBoxes(torch.rand(20, 2).repeat(1, 2) + torch.tensor([0, 0, 0.2, 0.3]))
+        for _ in range(3)
+    ]
+    confidence_list = [Confidences(torch.rand(20)) for _ in range(3)]
+    label_list = [Labels(torch.randint(0, 2, (20,))) for _ in range(3)]
+    expected = WeightedBoxesFusion()(box_list, confidence_list, label_list)
+    res = WeightedBoxesFusion(box_format="yolo")(
+        [pascal_to_yolo(x, (1, 1)) for x in box_list], confidence_list, label_list
+    )
+    assert torch.allclose(
+        yolo_to_pascal(YoloBoxes(res[0]), (1, 1)), expected[0], atol=1e-6
+    )
+    assert torch.equal(res[1], expected[1])
+
+
+def test_soft_nms() -> None:
+    boxes = PascalBoxes(
+        torch.tensor(
+            [[0.0, 0.0, 10.0, 10.0], [1, 1, 11, 11], [2, 2, 12, 12], [0, 0, 10, 10]]
+        )
+    )
+    confidences = Confidences(torch.tensor([0.9, 0.8, 0.7, 0.6]))
+    labels = Labels(torch.tensor([0, 0, 0, 1]))
+    ious = box_iou(boxes, boxes)
+
+    def confidence_of(res: t.Tuple[Tensor, Tensor, Tensor], box_id: int) -> float:
+        res_boxes, res_confidences, res_labels = res
+        same = (res_boxes == boxes[box_id]).all(dim=1) & (res_labels == labels[box_id])
+        return float(res_confidences[same][0])
+
+    res = SoftNMS(sigma=0.5)(boxes, confidences, labels)
+    assert confidence_of(res, 0) == float(confidences[0])
+    # the second box decays by its overlap with the first one only
+    expected = 0.8 * math.exp(-float(ious[0, 1]) ** 2 / 0.5)
+    assert math.isclose(confidence_of(res, 1), expected, rel_tol=1e-5)
+    # another class is left as is
+    assert math.isclose(confidence_of(res, 3), 0.6, rel_tol=1e-6)
+
+    res = SoftNMS(kernel="linear")(boxes, confidences, labels)
+    expected = 0.8 * (1 - float(ious[0, 1]))
+    assert math.isclose(confidence_of(res, 1), expected, rel_tol=1e-5)
+
+
+def test_wbf_bench(benchmark: t.Any) -> None:
+    box_list = [random_boxes(300, size=500, min_wh=50, max_wh=50) for _ in range(4)]
+    confidence_list = [Confidences(torch.rand(300)) for _ in range(4)]
+    label_list = [Labels(torch.randint(0, 10, (300,))) for _ in range(4)]
+    fn = WeightedBoxesFusion()
+    benchmark(lambda: fn(box_list, confidence_list, label_list))
@@ -21,6 +21,7 @@ from object_detection.utils import DetectionPlot
 from object_detection.models.backbones.resnet import (
     ResNetBackbone,
 )
+from object_detection.models.grid import mkgrid
 from torch.utils.data import DataLoader
 
 
@@ -86,3 +87,52 @@ def test_to_boxes() -> None:
     netout = (heatmap, sizemap, anchors)
     box_batch, conf_batch, label_batch = to_boxes(netout)
     assert len(box_batch) == len(conf_batch) == len(label_batch)
+
+
+def test_to_boxes_batch() -> None:
+    h, w = (64, 64)
+    heatmap: Any = torch.rand((4, 3, h, w))
+    sizemap: Any = torch.rand((4, 4, h, w)) * 0.1
+    anchors: Any = torch.rand((4, h, w))
+    netout = (heatmap, sizemap, anchors)
+    expected = ToBoxes(threshold=0.5, limit=20)(netout)
+    res = ToBoxes(threshold=0.5, limit=20, use_batch=True, topk=h * w)(netout)
+    assert len(res[0]) == len(expected[0]) == 4
+    for (boxes, confidences, labels), (
+        expected_boxes,
+        expected_confidences,
+        expected_labels,
+    ) in zip(zip(*res), zip(*expected)):
+        assert (confidences == expected_confidences).all()
+        # equal confidences may come in a different order
+        sort_indices = boxes[:, 0].argsort()
+        expected_sort_indices = expected_boxes[:, 0].argsort()
+        assert (boxes[sort_indices] == expected_boxes[expected_sort_indices]).all()
+        assert (labels[sort_indices] == expected_labels[expected_sort_indices]).all()
+
+
+@pytest.mark.parametrize("use_batch", [False, True])
+def test_to_boxes_bench(benchmark: Any, use_batch: bool) -> None:
+    h, w = (128, 128)
+    heatmap: Any = torch.rand((8, 80, h, w)) ** 4
+    sizemap: Any = torch.rand((8, 4, h, w)) * 0.1
+    anchors: Any = torch.rand((4, h, w))
+    to_boxes = ToBoxes(threshold=0.3, use_batch=use_batch)
+    benchmark(lambda: to_boxes((heatmap, sizemap, anchors)))
+
+
+@pytest.mark.parametrize("use_batch", [False, True])
+def test_to_boxes_nms_on_corners(use_batch: bool) -> None:
+    # two peaks of the same class with yolo boxes of iou 0.6.
+    # nms on (cx, cy, w, h) read as corners keeps both.
+    h, w = (16, 16)
+    heatmap: Any = torch.zeros((1, 1, h, w))
+    heatmap[0, 0, 8, 5] = 0.9
+    heatmap[0, 0, 8, 7] = 0.8
+    cxcy = (mkgrid(h, w) + 0.5) / torch.tensor([w, h]).view(2, 1, 1)
+    sizemap: Any = torch.cat([cxcy, torch.full((2, h, w), 0.5)]).unsqueeze(0)
+    anchors: Any = torch.zeros((4, h, w))
+    to_boxes = ToBoxes(iou_threshold=0.5, use_diff=False, use_batch=use_batch)
+    box_batch, conf_batch, _ = to_boxes((heatmap, sizemap, anchors))
+    assert conf_batch[0].tolist() == [pytest.approx(0.9)]
+    assert torch.allclose(box_batch[0], torch.tensor([[5.5 / w, 8.5 / h, 0.5, 0.5]]))
@@ -0,0 +1,210 @@
+import torch
+import pytest
+import typing as t
+from pathlib import Path
+from torch import nn, Tensor
+from object_detection.models import effidet, centernet
+from object_detection.models.deploy import (
+    EfficientDetPredictor,
+    CenterNetPredictor,
+    Detections,
+    export_module,
+    export_onnx,
+)
+from object_detection.models.utils import pad_by_batch
+from object_detection.models.backbones.effnet import EfficientNetBackbone
+from tests import random_boxes
+
+INPUT_SIZE = (128, 128)
+
+
+def _effdet() -> effidet.EfficientDet:
+    backbone = EfficientNetBackbone(0, out_channels=32, pretrained=False)
+    return effidet.EfficientDet(num_classes=2, backbone=backbone, channels=32).eval()
+
+
+def _centernet() -> centernet.CenterNet:
+    backbone = EfficientNetBackbone(0, out_channels=32, pretrained=False)
+    return centernet.CenterNet(channels=32, num_classes=2, backbone=backbone).eval()
+
+
+def _assert_same(
+    padded: t.Tuple[Tensor, Tensor, Tensor],
+    box_batch: t.Sequence[Tensor],
+    conf_batch: t.Sequence[Tensor],
+    label_batch: t.Sequence[Tensor],
+) -> None:
+    for boxes, scores, labels, expected_boxes, expected_scores, expected_labels in zip(
+        *padded, box_batch, conf_batch, label_batch
+    ):
+        count = int((labels >= 0).sum())
+        assert count == len(expected_scores)
+        assert torch.allclose(scores[:count], expected_scores.sort(descending=True)[0])
+        assert (scores[count:] == 0).all()
+        assert sorted(labels[:count].tolist()) == sorted(expected_labels.tolist())
+        assert torch.allclose(
+            boxes[:count].sum(dim=1).sort()[0],
+            expected_boxes.sum(dim=1).sort()[0],
+            atol=1e-4,
+        )
+
+
+def _assert_close(
+    padded: t.Tuple[Tensor, Tensor, Tensor], box_batch: t.Sequence[Tensor]
+) -> None:
+    # an untrained centernet gives plateaus of equal scores and negative sizes,
+    # where peaks and nms flip on float noise
+    boxes, _, labels = padded
+    for i, expected_boxes in enumerate(box_batch):
+        count = int((labels[i] >= 0).sum())
+        assert abs(count - len(expected_boxes)) <= len(expected_boxes) * 0.1
+        distances = torch.cdist(expected_boxes, boxes[i, :count]).min(dim=1)[0]
+        assert (distances < 1e-3).float().mean() > 0.9
+
+
+def test_effdet_predictor(tmp_path: Path) -> None:
+    model = _effdet()
+    to_boxes = effidet.ToBoxes(confidence_threshold=0.3, use_batch=True)
+    images = torch.rand(2, 3, *INPUT_SIZE)
+    predictor = EfficientDetPredictor(
+        model, to_boxes, INPUT_SIZE, max_detections=1000, fold_bn=False
+    )
+    torch.jit.script(predictor).save(str(tmp_path / "effdet.pt"))
+    scripted = torch.jit.load(str(tmp_path / "effdet.pt"))
+    with torch.no_grad():
+        res = scripted(images)
+        expected = to_boxes(model(images))
+    assert res[0].shape == (2, 1000, 4)
+    _assert_same(res, *expected)
+
+
+def test_centernet_predictor(tmp_path: Path) -> None:
+    model = _centernet()
+    to_boxes = centernet.ToBoxes(threshold=0.1, iou_threshold=0.5, use_batch=True)
+    images = torch.rand(2, 3, *INPUT_SIZE)
+    predictor = CenterNetPredictor(
+        model, to_boxes, INPUT_SIZE, max_detections=1000, fold_bn=False
+    )
+    torch.jit.script(predictor).save(str(tmp_path / "centernet.pt"))
+    scripted = torch.jit.load(str(tmp_path / "centernet.pt"))
+    with torch.no_grad():
+        res = scripted(images)
+        (heatmaps, boxmaps, anchormap), _ = model(images)
+        box_batch, _, _ = to_boxes((heatmaps, boxmaps, anchormap))
+    _assert_close(res, box_batch)
+
+
+@pytest.mark.parametrize("kind", ["effdet", "centernet"])
+def test_export_onnx(tmp_path: Path, kind: str) -> None:
+    ort = pytest.importorskip("onnxruntime")
+    model: t.Any
+    to_boxes: t.Any
+    if kind == "effdet":
+        model = _effdet()
+        to_boxes = effidet.ToBoxes(confidence_threshold=0.3, use_batch=True)
+    else:
+        model = _centernet()
+        to_boxes = centernet.ToBoxes(threshold=0.1, iou_threshold=0.5, use_batch=True)
+    path = str(tmp_path / f"{kind}.onnx")
+    export_onnx(model, to_boxes, path, INPUT_SIZE, max_detections=1000, fold_bn=False)
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    # exported with batch 1
+    images = torch.rand(3, 3, *INPUT_SIZE)
+    boxes, scores, labels = [
+        torch.from_numpy(x) for x in session.run(None, {"images": images.numpy()})
+    ]
+    assert boxes.shape == (3, 1000, 4)
+    with torch.no_grad():
+        outputs = model(images)
+    if kind == "effdet":
+        _assert_same((boxes, scores, labels), *to_boxes(outputs))
+    else:
+        box_batch, _, _ = to_boxes(outputs[0])
+        _assert_close((boxes, scores, labels), box_batch)
+
+
+class EfficientDetDecode(nn.Module):
+    anchors: Tensor
+
+    def __init__(self, anchors: Tensor) -> None:
+        super().__init__()
+        self.register_buffer("anchors", anchors)
+
+    def forward(self, box_diffs: Tensor, preds: Tensor) -> Detections:
+        batch_ids, boxes, confidences, labels = effidet.decode_batch(
+            self.anchors, box_diffs, preds, 0.5, 0.5, 100
+        )
+        return pad_by_batch(batch_ids, preds.shape[0], 100, boxes, confidences, labels)
+
+
+class CenterNetDecode(nn.Module):
+    anchormap: Tensor
+
+    def __init__(self, anchormap: Tensor) -> None:
+        super().__init__()
+        self.register_buffer("anchormap", anchormap)
+
+    def forward(self, kpmaps: Tensor, labelmaps: Tensor, boxmaps: Tensor) -> Detections:
+        _, h, w = kpmaps.shape
+        batch_ids, boxes, confidences, labels = centernet.decode_batch(
+            kpmaps, labelmaps, boxmaps, self.anchormap, 2, h * w, 0.5, 100, False
+        )
+        return pad_by_batch(batch_ids, kpmaps.shape[0], 100, boxes, confidences, labels)
+
+
+@pytest.mark.parametrize("kind", ["effdet", "centernet"])
+def test_export_decode_without_detections(tmp_path: Path, kind: str) -> None:
+    """
+    the example of the export has no detection, as a blank image for a trained model
+    """
+    ort = pytest.importorskip("onnxruntime")
+    module: nn.Module
+    example: t.Tuple[Tensor, ...]
+    inputs: t.Tuple[Tensor, ...]
+    if kind == "effdet":
+        anchor_count = 100
+        module = EfficientDetDecode(random_boxes(anchor_count, size=100))
+        names = ["box_diffs", "preds"]
+        example = (torch.zeros(1, anchor_count, 4), torch.zeros(1, anchor_count, 2))
+        inputs = (torch.randn(3, anchor_count, 4), torch.rand(3, anchor_count, 2))
+        candidates = (inputs[1].max(dim=2)[0] > 0.5).sum(dim=1)
+    else:
+        h, w = (16, 16)
+        module = CenterNetDecode(torch.zeros(4, h, w))
+        names = ["kpmaps", "labelmaps", "boxmaps"]
+        example = (
+            torch.zeros(1, h, w),
+            torch.zeros(1, h, w, dtype=torch.long),
+            torch.zeros(1, 4, h, w),
+        )
+        inputs = (
+            torch.rand(3, h, w) * (torch.rand(3, h, w) > 0.7),
+            torch.randint(0, 2, (3, h, w)),
+            torch.cat([torch.rand(3, 2, h, w), torch.full((3, 2, h, w), 0.3)], dim=1),
+        )
+        candidates = (inputs[0] > 0).flatten(1).sum(dim=1)
+    path = str(tmp_path / f"{kind}.onnx")
+    export_module(module, example, path, names, ["boxes", "scores", "labels"])
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    res = session.run(None, {k: v.numpy() for k, v in zip(names, inputs)})
+    with torch.no_grad():
+        assert (module(*example)[2] < 0).all()
+        expected = module(*inputs)
+    counts = (expected[2] >= 0).sum(dim=1)
+    # nms drops some of the overlapping candidates
+    assert ((counts > 0) & (counts < candidates)).all()
+    for x, y in zip(res, expected):
+        assert torch.allclose(torch.from_numpy(x), y, atol=1e-5)
+
+
+@pytest.mark.parametrize("mode", ["eager", "scripted"])
+def test_effdet_predictor_bench(benchmark: t.Any, mode: str) -> None:
+    model = _effdet()
+    to_boxes = effidet.ToBoxes(confidence_threshold=0.3, use_batch=True)
+    images = torch.rand(1, 3, 256, 256)
+    if mode == "scripted":
+        predictor = torch.jit.script(EfficientDetPredictor(model, to_boxes, (256, 256)))
+        run = lambda: predictor(images)
+    else:
+        run = lambda: to_boxes(model(images))
+    benchmark(torch.no_grad()(run))
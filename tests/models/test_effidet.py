@@ -1,6 +1,8 @@
 import torch
 import pytest
+import typing as t
 from typing import Any
+from torch import Tensor
 from object_detection.entities.image import ImageBatch
 from object_detection.entities.box import PascalBoxes, Labels
 from object_detection.models.effidet import (
@@ -9,12 +11,14 @@ from object_detection.models.effidet import (
     EfficientDet,
     Criterion,
     BoxDiff,
+    BoxDiffs,
     ToBoxes,
 )
 from object_detection.models.anchors import Anchors
 from object_detection.models.backbones.effnet import (
     EfficientNetBackbone,
 )
+from tests import random_boxes
 
 
 def test_regression_model() -> None:
@@ -48,3 +52,129 @@ def test_effdet_to_box() -> None:
     netout = net(images)
     for boxes, confidences, labels in zip(*to_boxes(netout)):
         assert len(boxes) == len(confidences) == len(labels) == limit
+
+
+def _random_netout(
+    batch_size: int, num_classes: int, sizes: t.List[int]
+) -> t.Tuple[t.List[Tensor], t.List[Tensor], t.List[Tensor]]:
+    anchor_levels: t.List[Tensor] = []
+    box_levels = []
+    label_levels = []
+    for size in sizes:
+        anchor_levels.append(random_boxes(size, size=500, max_wh=60))
+        box_levels.append(torch.rand(batch_size, size, 4) * 4)
+        label_levels.append(torch.rand(batch_size, size, num_classes))
+    return anchor_levels, box_levels, label_levels
+
+
+def test_to_boxes_batch() -> None:
+    netout: t.Any = _random_netout(4, 10, [1000, 300])
+    expected = ToBoxes(confidence_threshold=0.8, iou_threshold=0.3, limit=10)(netout)
+    res = ToBoxes(
+        confidence_threshold=0.8, iou_threshold=0.3, limit=10, use_batch=True
+    )(netout)
+    assert len(res[0]) == len(expected[0]) == 4
+    for (boxes, confidences, labels), (
+        expected_boxes,
+        expected_confidences,
+        expected_labels,
+    ) in zip(zip(*res), zip(*expected)):
+        assert (confidences == expected_confidences).all()
+        # equal confidences may come in a different order
+        sort_indices = boxes[:, 0].argsort()
+        expected_sort_indices = expected_boxes[:, 0].argsort()
+        assert (boxes[sort_indices] == expected_boxes[expected_sort_indices]).all()
+        assert (labels[sort_indices] == expected_labels[expected_sort_indices]).all()
+
+
+@pytest.mark.parametrize("use_batch", [False, True])
+def test_to_boxes_bench(benchmark: Any, use_batch: bool) -> None:
+    anchor_levels, box_levels, label_levels = _random_netout(8, 80, [10000, 2500])
+    # trained models output only a few confident scores per image
+    label_levels = [x * (torch.rand(x.shape) > 0.9995) for x in label_levels]
+    netout: t.Any = (anchor_levels, box_levels, label_levels)
+    to_boxes = ToBoxes(confidence_threshold=0.5, use_batch=use_batch)
+    benchmark(lambda: to_boxes(netout))
+
+
+def _random_targets(
+    counts: t.List[int], num_classes: int
+) -> t.Tuple[t.List[PascalBoxes], t.List[Labels]]:
+    gt_boxes = []
+    gt_labels = []
+    for count in counts:
+        gt_boxes.append(random_boxes(count, min_wh=20, max_wh=60))
+        gt_labels.append(Labels(torch.randint(0, num_classes, (count,))))
+    return gt_boxes, gt_labels
+
+
+def test_criterion() -> None:
+    num_classes = 4
+    images = ImageBatch(torch.zeros((3, 3, 256, 256)))
+    anchors = Anchors()
+    anchor_levels = [
+        anchors(ImageBatch(torch.zeros((1, 1, 32, 32))), 8),
+        anchors(ImageBatch(torch.zeros((1, 1, 16, 16))), 16),
+    ]
+    box_levels = [BoxDiffs(torch.randn(3, len(x), 4)) for x in anchor_levels]
+    label_levels = [torch.rand(3, len(x), num_classes) for x in anchor_levels]
+    gt_boxes, gt_labels = _random_targets([5, 0, 12], num_classes)
+    fn = Criterion(num_classes=num_classes, topk=9)
+    loss, box_loss, cls_loss = fn(
+        images, (anchor_levels, box_levels, label_levels), gt_boxes, gt_labels
+    )
+    expected = [
+        fn(
+            ImageBatch(images[[i]]),
+            (
+                anchor_levels,
+                [BoxDiffs(x[[i]]) for x in box_levels],
+                [x[[i]] for x in label_levels],
+            ),
+            [gt_boxes[i]],
+            [gt_labels[i]],
+        )
+        for i in range(3)
+    ]
+    for res, i in zip([loss, box_loss, cls_loss], range(3)):
+        assert (res - torch.stack([x[i] for x in expected]).mean()).abs() < 1e-3
+
+
+def test_criterion_bench(benchmark: Any) -> None:
+    batch_size = 8
+    num_classes = 80
+    images = ImageBatch(torch.zeros((batch_size, 3, 512, 512)))
+    anchors = Anchors()
+    anchor_levels = [
+        anchors(ImageBatch(torch.zeros((1, 1, 32, 32))), 16),
+        anchors(ImageBatch(torch.zeros((1, 1, 16, 16))), 32),
+    ]
+    box_levels = [BoxDiffs(torch.randn(batch_size, len(x), 4)) for x in anchor_levels]
+    label_levels = [torch.rand(batch_size, len(x), num_classes) for x in anchor_levels]
+    gt_boxes, gt_labels = _random_targets([20] * batch_size, num_classes)
+    fn = Criterion(num_classes=num_classes, topk=9)
+    benchmark(
+        lambda: fn(
+            images, (anchor_levels, box_levels, label_levels), gt_boxes, gt_labels
+        )
+    )
+
+
+def test_precompute_anchors() -> None:
+    backbone = EfficientNetBackbone(1, out_channels=32, pretrained=False)
+    net = EfficientDet(
+        num_classes=2,
+        backbone=backbone,
+        channels=32,
+        anchors=Anchors(use_cache=False),
+        input_size=(128, 128),
+    )
+    assert net.training
+    net.eval()
+    images = ImageBatch(torch.rand((2, 3, 128, 128)))
+    anchor_levels, _, _ = net(images)
+    assert anchor_levels[0] is net.anchors_0
+    net.input_size = None
+    expected_levels, _, _ = net(images)
+    for anchors, expected in zip(anchor_levels, expected_levels):
+        assert torch.equal(anchors, expected)
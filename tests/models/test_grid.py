@@ -0,0 +1,28 @@
+import torch
+from object_detection.models.grid import LRUCache, mkgrid, grid_cache
+
+
+def test_lru_cache() -> None:
+    cache: LRUCache[int, str] = LRUCache(maxsize=2)
+    cache.put(0, "a")
+    cache.put(1, "b")
+    assert cache.get(0) == "a"
+    cache.put(2, "c")
+    assert len(cache) == 2
+    assert cache.get(1) is None
+    assert cache.get(0) == "a"
+    assert cache.get(2) == "c"
+
+
+def test_mkgrid() -> None:
+    grid = mkgrid(2, 3, stride=4)
+    assert grid.shape == (2, 2, 3)
+    assert grid[0].tolist() == [[2, 6, 10], [2, 6, 10]]
+    assert grid[1].tolist() == [[2, 2, 2], [6, 6, 6]]
+    assert mkgrid(2, 3, stride=4) is grid
+    assert mkgrid(2, 3, stride=4, device=torch.device("cpu")) is grid
+    long_grid = mkgrid(2, 3, stride=4, dtype=torch.int64)
+    assert long_grid.dtype == torch.int64
+    assert long_grid is not grid
+    assert (mkgrid(2, 3) == torch.tensor([[[0, 1, 2]] * 2, [[0] * 3, [1] * 3]])).all()
+    assert len(grid_cache) <= grid_cache.maxsize
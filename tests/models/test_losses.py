@@ -8,6 +8,7 @@ from object_detection.models.losses import (
     DIoULoss,
     IoULoss,
     FocalLoss,
+    SparseFocalLoss,
     SigmoidFocalLoss,
 )
 from object_detection import PascalBoxes
@@ -136,3 +137,21 @@ def test_sigmoid_focal_loss(values: t.Any, expected: float) -> None:
         ]
     )
     res = fn(source, target).sum()
+
+
+def test_sparse_focal_loss() -> None:
+    pred = torch.rand(3, 100, 5)
+    batch_ids = torch.tensor([0, 0, 2, 2, 2])
+    anchor_ids = torch.tensor([1, 1, 10, 11, 99])
+    class_ids = torch.tensor([4, 4, 0, 3, 2])
+    target = torch.zeros(pred.shape)
+    target[batch_ids, anchor_ids, class_ids] = 1
+    expected = FocalLoss()(pred, target).sum(dim=(1, 2))
+    res = SparseFocalLoss()(pred, (batch_ids, anchor_ids, class_ids))
+    assert res.shape == (3,)
+    assert torch.allclose(res, expected)
+    empty = torch.zeros(0, dtype=torch.long)
+    res = SparseFocalLoss()(pred, (empty, empty, empty))
+    assert torch.allclose(
+        res, FocalLoss()(pred, torch.zeros(pred.shape)).sum(dim=(1, 2))
+    )
@@ -1,4 +1,5 @@
-import pytest, torch
+import pytest, torch, math
+import typing as t
 from object_detection.utils import DetectionPlot
 from object_detection.entities.box import YoloBoxes, Labels, BoxMaps, yolo_to_pascal
 from object_detection.models.mkmaps import MkGaussianMaps
@@ -36,3 +37,64 @@ def test_mkmaps() -> None:
     plot.draw_boxes(yolo_to_pascal(gt_boxes, (w, h)), color="blue")
     plot.draw_boxes(yolo_to_pascal(box_batch[0], (w, h)), color="red")
     plot.save(f"store/test-mk-gaussian-map.png")
+
+
+def _random_boxes(count: int, max_wh: float = 0.2) -> YoloBoxes:
+    return YoloBoxes(
+        torch.cat([torch.rand(count, 2), torch.rand(count, 2) * max_wh + 0.005], dim=1)
+    )
+
+
+@pytest.mark.parametrize("mode", ["length", "aspect", "constant"])
+@pytest.mark.parametrize("sigma", [0.5, 3.0, 20.0])
+def test_mkmaps_window(mode: t.Any, sigma: float) -> None:
+    gt_boxes = _random_boxes(100)
+    gt_labels = Labels(torch.randint(0, 3, (100,)))
+    hw = (64, 48)
+    expected = MkGaussianMaps(num_classes=3, sigma=sigma, mode=mode)(
+        [gt_boxes], [gt_labels], hw, hw
+    )
+    # a window larger than the map renders every pixel
+    res = MkGaussianMaps(num_classes=3, sigma=sigma, mode=mode, truncate=1e4)(
+        [gt_boxes], [gt_labels], hw, hw
+    )
+    assert (res == expected).all()
+    truncate = 3.0
+    res = MkGaussianMaps(num_classes=3, sigma=sigma, mode=mode, truncate=truncate)(
+        [gt_boxes], [gt_labels], hw, hw
+    )
+    assert ((res - expected).abs() <= math.exp(-(truncate ** 2) / 2)).all()
+
+
+@pytest.mark.parametrize("truncate", [None, 3.0])
+def test_mkmaps_bench(benchmark: t.Any, truncate: t.Optional[float]) -> None:
+    gt_boxes = _random_boxes(300, max_wh=0.05)
+    gt_labels = Labels(torch.zeros(300, dtype=torch.long))
+    mkmaps = MkGaussianMaps(num_classes=1, sigma=2.0, truncate=truncate)
+    benchmark(lambda: mkmaps([gt_boxes], [gt_labels], (128, 128), (512, 512)))
+
+
+@pytest.mark.parametrize("truncate", [None, 3.0])
+def test_mkmaps_batch(truncate: t.Optional[float]) -> None:
+    counts = [30, 0, 50, 7]
+    box_batch = [_random_boxes(x) for x in counts]
+    label_batch = [Labels(torch.randint(0, 5, (x,))) for x in counts]
+    hw = (64, 48)
+    expected = MkGaussianMaps(num_classes=5, sigma=2.0, truncate=truncate)(
+        box_batch, label_batch, hw, hw
+    )
+    res = MkGaussianMaps(num_classes=5, sigma=2.0, truncate=truncate, use_batch=True)(
+        box_batch, label_batch, hw, hw
+    )
+    assert res.shape == (4, 5, 64, 48)
+    assert (res == expected).all()
+
+
+@pytest.mark.parametrize("use_batch", [False, True])
+def test_mkmaps_batch_bench(benchmark: t.Any, use_batch: bool) -> None:
+    box_batch = [_random_boxes(20, max_wh=0.05) for _ in range(8)]
+    label_batch = [Labels(torch.randint(0, 80, (20,))) for _ in range(8)]
+    mkmaps = MkGaussianMaps(
+        num_classes=80, sigma=2.0, truncate=3.0, use_batch=use_batch
+    )
+    benchmark(lambda: mkmaps(box_batch, label_batch, (128, 128), (512, 512)))
@@ -1,9 +1,18 @@
+import math
 import torch
+import pytest
+import typing as t
+import torch.nn.functional as F
+from torch import Tensor
 from object_detection.models.modules import (
     Hswish,
     Hsigmoid,
     CSE2d,
+    Conv2dStaticSamePadding,
+    MaxPool2dStaticSamePadding,
+    fix_same_padding,
 )
+from object_detection.models.bifpn import BiFPN
 
 
 def test_hswish() -> None:
@@ -23,3 +32,62 @@ def test_cse2d() -> None:
     m = CSE2d(3, 2)
     res = m(req)
     assert req.shape == res.shape
+
+
+def _reference_same_pad(x: Tensor, kernel_size: int, stride: int) -> Tensor:
+    h, w = x.shape[-2:]
+    extra_h = (math.ceil(w / stride) - 1) * stride - w + kernel_size
+    extra_v = (math.ceil(h / stride) - 1) * stride - h + kernel_size
+    left = extra_h // 2
+    top = extra_v // 2
+    return F.pad(x, [left, extra_h - left, top, extra_v - top])
+
+
+@pytest.mark.parametrize("kernel_size, stride", [(1, 1), (3, 1), (3, 2), (2, 1)])
+def test_conv2d_static_same_padding(kernel_size: int, stride: int) -> None:
+    m = Conv2dStaticSamePadding(2, 4, kernel_size, stride=stride)
+    assert m.folded == (stride == 1 and kernel_size % 2 == 1)
+    for h, w in [(9, 10), (16, 16)]:
+        x = torch.rand(1, 2, h, w)
+        expected = F.conv2d(
+            _reference_same_pad(x, kernel_size, stride),
+            m.conv.weight,
+            m.conv.bias,
+            stride=stride,
+        )
+        assert torch.allclose(m(x), expected, atol=1e-6)
+        m.set_input_size([h, w])
+        assert torch.allclose(m(x), expected, atol=1e-6)
+
+
+def test_max_pool2d_static_same_padding() -> None:
+    m = MaxPool2dStaticSamePadding(3, 2)
+    scripted = torch.jit.script(m)
+    for h, w in [(9, 10), (16, 16)]:
+        x = torch.rand(1, 2, h, w) - 0.5
+        expected = F.max_pool2d(_reference_same_pad(x, 3, 2), 3, 2)
+        assert torch.equal(m(x), expected)
+        assert torch.equal(scripted(x), expected)
+
+
+def test_fix_same_padding() -> None:
+    channels = 8
+    fn = BiFPN(channels=channels)
+    inputs = tuple(torch.rand(1, channels, s, s) for s in [32, 16, 8, 4, 2])
+    fn.eval()
+    expected = fn(inputs)
+    fix_same_padding(fn, inputs)
+    assert fn.p4_downsample.input_size == [32, 32]
+    assert fn.p7_downsample.input_size == [4, 4]
+    for e, r in zip(expected, fn(inputs)):
+        assert torch.equal(e, r)
+
+
+@pytest.mark.parametrize("fixed", [False, True])
+def test_bifpn_same_padding_bench(benchmark: t.Any, fixed: bool) -> None:
+    channels = 64
+    fn = BiFPN(channels=channels).eval()
+    inputs = tuple(torch.rand(1, channels, s, s) for s in [64, 32, 16, 8, 4])
+    if fixed:
+        fix_same_padding(fn, inputs)
+    benchmark(torch.no_grad()(lambda: fn(inputs)))
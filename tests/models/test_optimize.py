@@ -0,0 +1,98 @@
+import torch
+import pytest
+import typing as t
+from torch import nn
+from object_detection.models.modules import (
+    ConvBR2d,
+    SeparableConvBR2d,
+    MemoryEfficientSwish,
+)
+from object_detection.models.optimize import optimize_for_inference, fuse_conv_bn
+from object_detection.models.effidet import EfficientDet
+from object_detection.models.centernet import CenterNet
+from object_detection.models.backbones.effnet import EfficientNetBackbone
+
+
+def _randomize_bn(model: nn.Module) -> nn.Module:
+    for m in model.modules():
+        if isinstance(m, nn.BatchNorm2d):
+            m.running_mean.uniform_(-0.5, 0.5)  # type:ignore
+            m.running_var.uniform_(0.5, 1.5)  # type:ignore
+            m.weight.data.uniform_(0.5, 1.5)
+            m.bias.data.uniform_(-0.5, 0.5)
+    return model.eval()
+
+
+def _effdet() -> EfficientDet:
+    backbone = EfficientNetBackbone(0, out_channels=32, pretrained=False)
+    return EfficientDet(num_classes=2, backbone=backbone, channels=32)
+
+
+def _centernet() -> CenterNet:
+    backbone = EfficientNetBackbone(0, out_channels=32, pretrained=False)
+    return CenterNet(channels=32, num_classes=2, backbone=backbone)
+
+
+@pytest.mark.parametrize("groups", [1, 4])
+def test_fuse_conv_bn(groups: int) -> None:
+    conv = nn.Conv2d(4, 8, 3, padding=1, groups=groups, bias=groups == 1)
+    bn = nn.BatchNorm2d(8)
+    _randomize_bn(bn)
+    x = torch.rand(2, 4, 10, 10)
+    expected = bn(conv(x))
+    fuse_conv_bn(conv, bn)
+    assert torch.allclose(conv(x), expected, atol=1e-5)
+
+
+def test_optimize_modules() -> None:
+    model = _randomize_bn(
+        nn.Sequential(
+            ConvBR2d(4, 8),
+            MemoryEfficientSwish(),
+            SeparableConvBR2d(8, 16),
+        )
+    )
+    x = torch.rand(2, 4, 10, 10)
+    optimized = optimize_for_inference(model)
+    assert not any(isinstance(m, nn.BatchNorm2d) for m in optimized.modules())
+    assert not any(isinstance(m, MemoryEfficientSwish) for m in optimized.modules())
+    # the original is left as is
+    assert any(isinstance(m, nn.BatchNorm2d) for m in model.modules())
+    assert torch.allclose(optimized(x), model(x), atol=1e-5)
+
+
+def test_optimize_effdet() -> None:
+    model = _randomize_bn(_effdet())
+    images = torch.rand(2, 3, 128, 128)
+    optimized = optimize_for_inference(model)
+    assert not any(isinstance(m, nn.BatchNorm2d) for m in optimized.modules())
+    with torch.no_grad():
+        expected = model(images)
+        res = optimized(images)
+    for expected_levels, levels in zip(expected, res):
+        for e, r in zip(expected_levels, levels):
+            assert torch.allclose(e, r, atol=1e-4)
+
+
+def test_optimize_centernet() -> None:
+    model = _randomize_bn(_centernet())
+    images = torch.rand(2, 3, 128, 128)
+    optimized = optimize_for_inference(model)
+    with torch.no_grad():
+        (expected, _), (res, _) = model(images), optimized(images)
+    for e, r in zip(expected, res):
+        assert torch.allclose(e, r, atol=1e-4)
+
+
+@pytest.mark.parametrize("optimized", [False, True])
+def test_optimize_bench(benchmark: t.Any, optimized: bool) -> None:
+    model = _effdet().eval()
+    if optimized:
+        model = optimize_for_inference(model)
+    images = torch.rand(1, 3, 256, 256)
+
+    @torch.no_grad()
+    def run() -> None:
+        model(images)
+
+    benchmark(run)
@@ -0,0 +1,76 @@
+import torch
+import pytest
+import typing as t
+from torch import nn
+from torch.utils.data import DataLoader
+from object_detection.entities import ImageId, Image
+from object_detection.models.effidet import (
+    EfficientDet,
+    ToBoxes,
+    prediction_collate_fn,
+)
+from object_detection.models.backbones.effnet import EfficientNetBackbone
+from object_detection.models.modules import fix_same_padding
+from object_detection.models.quantize import freeze_same_padding, quantize_effdet
+
+INPUT_SIZE = (128, 128)
+
+
+def _effdet() -> EfficientDet:
+    backbone = EfficientNetBackbone(0, out_channels=32, pretrained=False)
+    return EfficientDet(num_classes=2, backbone=backbone, channels=32).eval()
+
+
+def _loader(count: int = 8) -> DataLoader:
+    samples = [
+        (ImageId(str(i)), Image(torch.rand(3, *INPUT_SIZE))) for i in range(count)
+    ]
+    return DataLoader(
+        samples, batch_size=4, collate_fn=prediction_collate_fn  # type:ignore
+    )
+
+
+def test_freeze_same_padding() -> None:
+    model = _effdet()
+    images = torch.rand(2, 3, *INPUT_SIZE)
+    fix_same_padding(model, images[:1])
+    with torch.no_grad():
+        expected = model(images)
+        asymmetric = freeze_same_padding(model)
+        res = model(images)
+    assert asymmetric
+    modules = dict(model.named_modules())
+    for name in asymmetric:
+        assert isinstance(modules[name][0], nn.ZeroPad2d)
+        assert modules[name][1].groups > 1
+    for x, y in zip(res[1] + res[2], expected[1] + expected[2]):
+        assert torch.allclose(x, y, atol=1e-5)
+
+
+def test_quantize_effdet() -> None:
+    quantized = pytest.importorskip("torch.ao.nn.quantized")
+    model = _effdet()
+    quantized_model = quantize_effdet(model, _loader(), INPUT_SIZE)
+    assert any(isinstance(m, quantized.Conv2d) for m in quantized_model.modules())
+    images = torch.rand(2, 3, *INPUT_SIZE)
+    to_boxes = ToBoxes(confidence_threshold=0.3, use_batch=True)
+    with torch.no_grad():
+        _, box_levels, label_levels = quantized_model(images)
+        _, expected_box_levels, expected_label_levels = model(images)
+        box_batch, _, _ = to_boxes(quantized_model(images))
+    for x, y in zip(
+        box_levels + label_levels, expected_box_levels + expected_label_levels
+    ):
+        assert x.dtype == torch.float32
+        assert (x - y).abs().max() < 0.05
+    assert len(box_batch) == 2
+
+
+@pytest.mark.parametrize("mode", ["fp32", "int8"])
+def test_quantize_effdet_bench(benchmark: t.Any, mode: str) -> None:
+    model = _effdet()
+    if mode == "int8":
+        pytest.importorskip("torch.ao.quantization")
+        model = quantize_effdet(model, _loader(), INPUT_SIZE)
+    images = torch.rand(4, 3, *INPUT_SIZE)
+    benchmark(torch.no_grad()(lambda: model(images)))
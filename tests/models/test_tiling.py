@@ -0,0 +1,117 @@
+import torch
+import typing as t
+from torch import nn, Tensor
+from object_detection.entities import (
+    YoloBoxes,
+    PascalBoxes,
+    Confidences,
+    Labels,
+    Image,
+    yolo_to_pascal,
+)
+from object_detection.models.tiling import TiledInference, tile_starts
+from object_detection.models.box_fusion import WeightedBoxesFusion
+
+BOX_SIZE = 6
+
+
+class DotModel(nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batch_sizes: t.List[int] = []
+
+    def forward(self, images: Tensor) -> Tensor:
+        self.batch_sizes.append(len(images))
+        return images
+
+
+def dot_to_boxes(
+    images: Tensor,
+) -> t.Tuple[t.List[YoloBoxes], t.List[Confidences], t.List[Labels]]:
+    """
+    a box of BOX_SIZE pixels around each lit pixel, labeled by the channel
+    """
+    _, _, h, w = images.shape
+    box_batch = []
+    conf_batch = []
+    label_batch = []
+    for image in images:
+        labels, ys, xs = (image > 0).nonzero().unbind(1)
+        cx = (xs.float() + 0.5) / w
+        cy = (ys.float() + 0.5) / h
+        wh = torch.full_like(cx, BOX_SIZE)
+        box_batch.append(YoloBoxes(torch.stack([cx, cy, wh / w, wh / h], 1)))
+        conf_batch.append(Confidences(image[labels, ys, xs]))
+        label_batch.append(Labels(labels))
+    return box_batch, conf_batch, label_batch
+
+
+def dot_to_pascal_boxes(
+    images: Tensor,
+) -> t.Tuple[t.List[PascalBoxes], t.List[Confidences], t.List[Labels]]:
+    """
+    dot_to_boxes in pixels, as effidet.ToBoxes
+    """
+    _, _, h, w = images.shape
+    box_batch, conf_batch, label_batch = dot_to_boxes(images)
+    return [yolo_to_pascal(x, (w, h)) for x in box_batch], conf_batch, label_batch
+
+
+def _dot_image() -> t.Tuple[Image, Tensor]:
+    image = torch.zeros((2, 70, 100))
+    # near tile borders and image borders
+    dots = torch.tensor(
+        [[0, 10, 10], [0, 24, 40], [1, 24, 40], [0, 36, 47], [1, 66, 97], [0, 50, 3]]
+    )
+    image[dots[:, 0], dots[:, 1], dots[:, 2]] = 1.0
+    return Image(image), dots
+
+
+def test_tile_starts() -> None:
+    assert tile_starts(100, 32, 16) == [0, 16, 32, 48, 64, 68]
+    assert tile_starts(64, 32, 16) == [0, 16, 32]
+    assert tile_starts(20, 32, 16) == [0]
+
+
+def test_tiled_inference() -> None:
+    image, dots = _dot_image()
+    model = DotModel()
+    fn = TiledInference(dot_to_boxes, tile_size=(32, 24), overlap=16, batch_size=4)
+    boxes, confidences, labels = fn(model, image)
+    assert max(model.batch_sizes) == 4
+    assert sum(model.batch_sizes) == len(fn.tiles((100, 70)))
+    order = torch.argsort(labels * 10000 + boxes[:, 1].long() * 100 + boxes[:, 0])
+    expected = dots[torch.argsort(dots[:, 0] * 10000 + dots[:, 1] * 100 + dots[:, 2])]
+    assert labels[order].tolist() == expected[:, 0].tolist()
+    centers = (boxes[order, :2] + boxes[order, 2:]) / 2
+    assert torch.allclose(centers, expected[:, [2, 1]].float() + 0.5)
+    assert torch.allclose(boxes[:, 2:] - boxes[:, :2], torch.tensor(float(BOX_SIZE)))
+    assert torch.allclose(confidences, torch.ones(len(dots)))
+
+
+def test_tiled_inference_fusion() -> None:
+    image, dots = _dot_image()
+    fn = TiledInference(
+        dot_to_boxes, tile_size=(32, 24), overlap=16, fusion=WeightedBoxesFusion()
+    )
+    boxes, _, _ = fn(DotModel(), image)
+    assert len(boxes) == len(dots)
+
+
+def test_tiled_inference_small_image() -> None:
+    image, dots = _dot_image()
+    fn = TiledInference(dot_to_boxes, tile_size=(128, 128), overlap=16)
+    boxes, _, _ = fn(DotModel(), image)
+    assert len(boxes) == len(dots)
+
+
+def test_tiled_inference_pascal() -> None:
+    image, _ = _dot_image()
+    expected = TiledInference(dot_to_boxes, tile_size=(32, 24), overlap=16)(
+        DotModel(), image
+    )
+    res = TiledInference(
+        dot_to_pascal_boxes, tile_size=(32, 24), overlap=16, box_format="pascal"
+    )(DotModel(), image)
+    for x, y in zip(res, expected):
+        assert torch.allclose(x.float(), y.float())
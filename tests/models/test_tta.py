@@ -0,0 +1,88 @@
+import torch
+import typing as t
+from torch import nn, Tensor
+from object_detection.entities import YoloBoxes, Confidences, Labels, ImageBatch
+from object_detection.models.tta import MultiViewTTA
+from object_detection.models.box_fusion import WeightedBoxesFusion
+
+
+class PeakModel(nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batch_sizes: t.List[int] = []
+
+    def forward(self, images: Tensor) -> Tensor:
+        self.batch_sizes.append(len(images))
+        return images
+
+
+def peak_to_boxes(
+    images: Tensor,
+) -> t.Tuple[t.List[YoloBoxes], t.List[Confidences], t.List[Labels]]:
+    """
+    a box of 0.1 around the brightest pixel of each image
+    """
+    _, _, h, w = images.shape
+    peaks = images[:, 0].flatten(1).argmax(dim=1)
+    cx = ((peaks % w).float() + 0.5) / w
+    cy = ((peaks // w).float() + 0.5) / h
+    boxes = torch.stack([cx, cy, torch.full_like(cx, 0.1), torch.full_like(cy, 0.1)], 1)
+    return (
+        [YoloBoxes(x.view(1, 4)) for x in boxes],
+        [Confidences(torch.ones(1)) for _ in boxes],
+        [Labels(torch.zeros(1, dtype=torch.long)) for _ in boxes],
+    )
+
+
+def _peak_images() -> ImageBatch:
+    images = torch.zeros((3, 3, 16, 20))
+    images[0, :, 2, 3] = 1
+    images[1, :, 10, 15] = 1
+    images[2, :, 7, 0] = 1
+    return ImageBatch(images)
+
+
+def test_multi_view_tta() -> None:
+    images = _peak_images()
+    model = PeakModel()
+    expected, _, _ = peak_to_boxes(images)
+    tta = MultiViewTTA(peak_to_boxes)
+    box_batch, conf_batch, label_batch = tta(model, images)
+    assert model.batch_sizes == [12]
+    for boxes, confidences, labels, expected_boxes in zip(
+        box_batch, conf_batch, label_batch, expected
+    ):
+        assert boxes.shape == (4, 4)
+        assert len(confidences) == len(labels) == 4
+        assert torch.allclose(boxes, expected_boxes.expand(4, 4))
+
+
+def test_multi_view_tta_chunk() -> None:
+    images = _peak_images()
+    model = PeakModel()
+    expected = MultiViewTTA(peak_to_boxes)(model, images)
+    model.batch_sizes = []
+    res = MultiViewTTA(peak_to_boxes, chunk_size=5)(model, images)
+    assert model.batch_sizes == [5, 5, 2]
+    for r, e in zip(res, expected):
+        for x, y in zip(r, e):  # type:ignore
+            assert torch.equal(x, y)
+
+
+def test_multi_view_tta_nms() -> None:
+    images = _peak_images()
+    box_batch, conf_batch, label_batch = MultiViewTTA(peak_to_boxes, iou_threshold=0.5)(
+        PeakModel(), images
+    )
+    assert [len(x) for x in box_batch] == [1, 1, 1]
+
+
+def test_multi_view_tta_fusion() -> None:
+    images = _peak_images()
+    expected, _, _ = peak_to_boxes(images)
+    box_batch, conf_batch, _ = MultiViewTTA(
+        peak_to_boxes, fusion=WeightedBoxesFusion(box_format="yolo")
+    )(PeakModel(), images)
+    for boxes, confidences, expected_boxes in zip(box_batch, conf_batch, expected):
+        assert torch.allclose(boxes, expected_boxes, atol=1e-6)
+        assert torch.allclose(confidences, torch.ones(1))
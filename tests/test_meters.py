@@ -0,0 +1,14 @@
+from object_detection.meters import PercentileMeter
+
+
+def test_percentile_meter() -> None:
+    meter = PercentileMeter(window=10)
+    assert meter.get_value(50) == 0.0
+    for i in range(100):
+        meter.update(float(i))
+    assert meter.count == 100
+    assert len(meter.values) == 10
+    assert meter.get_value(0) == 90.0
+    meter.reset()
+    assert meter.count == 0
+    assert meter.get_value(99) == 0.0
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import torch
+import typing as t
+from torch import nn, Tensor
+from object_detection.entities import (
+    ImageId,
+    Image,
+    YoloBoxes,
+    Confidences,
+    Labels,
+)
+from object_detection.serving import (
+    BatchPredictor,
+    InferenceServer,
+    InferenceClient,
+)
+
+
+class PeakModel(nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batch_sizes: t.List[int] = []
+
+    def forward(self, images: Tensor) -> Tensor:
+        self.batch_sizes.append(len(images))
+        return images
+
+
+def peak_to_boxes(
+    images: Tensor,
+) -> t.Tuple[t.List[YoloBoxes], t.List[Confidences], t.List[Labels]]:
+    _, _, h, w = images.shape
+    peaks = images[:, 0].flatten(1).argmax(dim=1)
+    cx = ((peaks % w).float() + 0.5) / w
+    cy = ((peaks // w).float() + 0.5) / h
+    boxes = torch.stack([cx, cy, torch.full_like(cx, 0.1), torch.full_like(cy, 0.1)], 1)
+    return (
+        [YoloBoxes(x.view(1, 4)) for x in boxes],
+        [Confidences(torch.ones(1)) for _ in boxes],
+        [Labels(torch.zeros(1, dtype=torch.long)) for _ in boxes],
+    )
+
+
+def _samples(count: int) -> t.List[t.Tuple[ImageId, Image]]:
+    samples = []
+    for i in range(count):
+        image = torch.zeros((3, 8, 10))
+        image[:, i % 8, i % 10] = 1
+        samples.append((ImageId(str(i)), Image(image)))
+    return samples
+
+
+def test_batch_predictor() -> None:
+    samples = _samples(10)
+    model = PeakModel()
+    predictor = BatchPredictor(model, peak_to_boxes, max_batch_size=4, max_wait=0.05)
+
+    async def run() -> t.List[t.Any]:
+        task = asyncio.ensure_future(predictor.run())
+        await asyncio.sleep(0)
+        res = await asyncio.gather(*[predictor(x) for x in samples])
+        task.cancel()
+        return res
+
+    res = asyncio.run(run())
+    assert sorted(model.batch_sizes) == [2, 4, 4]
+    for (image_id, image), (res_id, boxes, _, _) in zip(samples, res):
+        assert res_id == image_id
+        expected, _, _ = peak_to_boxes(image.unsqueeze(0))
+        assert torch.equal(boxes, expected[0])
+    metrics = predictor.metrics()
+    assert metrics["count"] == 10
+    assert metrics["batch_size"] == 10 / 3
+    assert metrics["latency_p50"] <= metrics["latency_p99"]
+
+
+def test_batch_predictor_metrics_before_requests() -> None:
+    metrics = BatchPredictor(PeakModel(), peak_to_boxes).metrics()
+    assert metrics["count"] == 0
+    json.dumps(metrics, allow_nan=False)
+
+
+def test_inference_server() -> None:
+    samples = _samples(6)
+    model = PeakModel()
+    server = InferenceServer(
+        BatchPredictor(model, peak_to_boxes, max_batch_size=8, max_wait=0.05),
+        port=0,
+    )
+
+    async def run() -> t.Tuple[t.List[t.Any], t.Dict[str, float]]:
+        await server.start()
+        clients = [InferenceClient(port=server.port) for _ in samples]
+        res = await asyncio.gather(*[c.predict(x) for c, x in zip(clients, samples)])
+        metrics = await clients[0].metrics()
+        for c in clients:
+            await c.close()
+        await server.close()
+        return res, metrics
+
+    res, metrics = asyncio.run(run())
+    assert len(model.batch_sizes) < len(samples)
+    assert metrics["count"] == len(samples)
+    for (image_id, image), (res_id, boxes, _, labels) in zip(samples, res):
+        assert res_id == image_id
+        expected, _, _ = peak_to_boxes(image.unsqueeze(0))
+        assert torch.allclose(boxes, expected[0])
+        assert labels.tolist() == [0]